@@ -1,6 +1,6 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import uvicorn
@@ -48,6 +48,12 @@ app.add_middleware(
 symptom_checker = MLSymptomCheckerService()
 image_analyzer = MLImageAnalysisService()
 
+# The OpenAI-backed checker is only used for streamed analysis and needs an API key
+streaming_symptom_checker = None
+if os.getenv("OPENAI_API_KEY"):
+    from services.symptom_checker import SymptomCheckerService
+    streaming_symptom_checker = SymptomCheckerService()
+
 @app.get("/")
 async def root():
     return {
@@ -85,6 +91,30 @@ async def analyze_symptoms(request: SymptomRequest):
         logger.error(f"Error analyzing symptoms: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error analyzing symptoms: {str(e)}")
 
+@app.post("/api/symptoms/analyze/stream")
+async def analyze_symptoms_stream(request: SymptomRequest):
+    """
+    Stream symptom analysis as server-sent events: one "condition" event per
+    possible condition as it arrives, then a final "result" event
+    """
+    if streaming_symptom_checker is None:
+        raise HTTPException(status_code=503, detail="Streaming analysis requires OPENAI_API_KEY")
+    
+    if not request.symptoms or len(request.symptoms) == 0:
+        raise HTTPException(status_code=400, detail="At least one symptom must be provided")
+    
+    if not request.user_id:
+        raise HTTPException(status_code=400, detail="User ID is required")
+    
+    logger.info(f"Streaming symptom analysis for user: {request.user_id}")
+    
+    async def event_stream():
+        async for item in streaming_symptom_checker.stream_symptom_analysis(request):
+            event = "result" if isinstance(item, SymptomResponse) else "condition"
+            yield f"event: {event}\ndata: {item.model_dump_json()}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat_with_bot(message: ChatMessage):
     """
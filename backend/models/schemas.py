@@ -49,6 +49,13 @@ class SymptomResponse(BaseModel):
     timestamp: datetime = Field(default_factory=datetime.now)
     disclaimer: str = Field(..., description="Medical disclaimer text")
 
+class AnalysisPayload(BaseModel):
+    """Shape of the symptom analysis the model is constrained to emit"""
+    possible_conditions: List[PossibleCondition]
+    first_aid_advice: FirstAidAdvice
+    confidence_score: float = Field(..., ge=0, le=1, description="Overall confidence in the assessment")
+    follow_up_questions: List[str] = Field(..., description="Suggested follow-up questions")
+
 class ChatMessage(BaseModel):
     user_id: str = Field(..., description="Unique identifier for the user")
     message: str = Field(..., description="User's message")
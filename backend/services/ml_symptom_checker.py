@@ -5,8 +5,8 @@ Replaces OpenAI-based symptom analysis with trained ML models
 import sys
 import os
 import logging
+import time
 from typing import List, Dict, Any
-from datetime import datetime
 
 # Add the ml_models directory to the path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'ml_models'))
@@ -258,7 +258,7 @@ class MLSymptomCheckerService:
                 suggested_questions=suggested_questions,
                 confidence_level=self._get_confidence_level(prediction['confidence_score']),
                 requires_professional_consultation=requires_consultation,
-                session_id=message.session_id or f"ml_session_{message.user_id}_{datetime.now().timestamp()}"
+                session_id=message.session_id or f"ml_session_{message.user_id}_{time.time_ns()}"
             )
             
         except Exception as e:
@@ -1,10 +1,15 @@
 import openai
+import jiter
+import copy
 import json
 import logging
-from typing import List, Dict, Any
-from datetime import datetime
+import asyncio
+import random
+import time
+from typing import List, Dict, Any, AsyncIterator, Union
 import os
 from models.schemas import (
+    AnalysisPayload,
     SymptomRequest, 
     SymptomResponse, 
     PossibleCondition, 
@@ -16,10 +21,109 @@ from models.schemas import (
 
 logger = logging.getLogger(__name__)
 
+# Static payloads for the error paths, built once at import time
+_DISCLAIMER = """
+        IMPORTANT: This AI assessment is for educational purposes only and is not a substitute for professional medical advice, diagnosis, or treatment. Always seek the advice of qualified health professionals with any questions about medical conditions. If you have a medical emergency, call emergency services immediately.
+        """
+
+_ERROR_FIRST_AID = FirstAidAdvice(
+    immediate_actions=("Consult with a healthcare professional",),
+    do_not_do=("Do not ignore persistent symptoms",),
+    when_to_seek_help=("If symptoms persist or worsen",),
+    emergency_signs=("Severe pain, difficulty breathing, chest pain",)
+)
+
+_ERROR_FOLLOW_UP_QUESTIONS = ("Please describe your symptoms again",)
+
+_ERROR_CHAT_MESSAGE = "I apologize, but I'm having trouble processing your message right now. Please try again or consult with a healthcare professional for your health concerns."
+
+_ERROR_CHAT_QUESTIONS = ("Could you rephrase your question?", "Would you like to start over?")
+
+# Transient OpenAI failures that are worth retrying
+_RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+def _strict_json_schema(schema: Any, defs: Dict[str, Any] = None) -> Any:
+    """
+    Adapt a pydantic JSON schema for OpenAI strict structured outputs: every
+    object closes additionalProperties and lists all of its properties as required,
+    single-entry allOf wrappers around $ref are flattened, and a $ref that has
+    sibling keys (e.g. a field description) is replaced by the definition it
+    points to, since strict mode rejects such refs
+    """
+    if defs is None:
+        defs = schema.get("$defs", {})
+    if isinstance(schema, dict):
+        if len(schema.get("allOf", ())) == 1:
+            schema.update(schema.pop("allOf")[0])
+        if "$ref" in schema and len(schema) > 1:
+            definition = defs[schema.pop("$ref").rsplit("/", 1)[-1]]
+            for key, value in definition.items():
+                schema.setdefault(key, copy.deepcopy(value))
+        if schema.get("type") == "object" and "properties" in schema:
+            schema["additionalProperties"] = False
+            schema["required"] = list(schema["properties"])
+        for value in schema.values():
+            _strict_json_schema(value, defs)
+    elif isinstance(schema, list):
+        for item in schema:
+            _strict_json_schema(item, defs)
+    return schema
+
+# Constrained decoding guarantees the analysis parses, so no repair/retry path is needed
+_ANALYSIS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "symptom_analysis",
+        "strict": True,
+        "schema": _strict_json_schema(AnalysisPayload.model_json_schema())
+    }
+}
+
+class CircuitOpenError(Exception):
+    """Raised when OpenAI calls are short-circuited after repeated failures"""
+
+class CircuitBreaker:
+    """
+    Minimal circuit breaker: opens after fail_max consecutive failures and
+    lets a single trial call through once reset_timeout seconds have passed
+    """
+    def __init__(self, fail_max: int = 20, reset_timeout: float = 30.0):
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            # Half-open: re-arm the timer so only this caller probes upstream
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.fail_max:
+            self.opened_at = time.monotonic()
+
 class SymptomCheckerService:
+    MODEL = "gpt-4o"  # Structured outputs need the gpt-4o family
+    MAX_ATTEMPTS = 4
+    BACKOFF_INITIAL = 0.5
+    BACKOFF_MAX = 8.0
+
     def __init__(self):
         openai.api_key = os.getenv("OPENAI_API_KEY")
-        self.client = openai.OpenAI()
+        # Retries are handled here rather than in the client so the breaker sees every failure
+        self.client = openai.AsyncOpenAI(max_retries=0)
+        self.circuit_breaker = CircuitBreaker()
+        # In-flight analyses keyed by _cache_key, shared by identical concurrent requests
+        self._inflight: Dict[str, asyncio.Future] = {}
         self.system_prompt = self._get_system_prompt()
         
     def _get_system_prompt(self) -> str:
@@ -62,7 +166,46 @@ class SymptomCheckerService:
 
     async def analyze_symptoms(self, request: SymptomRequest) -> SymptomResponse:
         """
-        Analyze symptoms and provide preliminary assessment
+        Analyze symptoms and provide preliminary assessment. Identical requests
+        that arrive while one is already in flight await the same result.
+        """
+        key = self._cache_key(request)
+        while (inflight := self._inflight.get(key)) is not None:
+            try:
+                shared = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # The leading request was cancelled, not this one; retry, possibly as the new leader
+                if inflight.cancelled():
+                    continue
+                raise
+            return shared.model_copy(update={"user_id": request.user_id})
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._run_analysis(request)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a future nobody awaited does not log a warning
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def _cache_key(self, request: SymptomRequest) -> str:
+        """
+        Key identifying requests that would produce the same analysis (user_id excluded)
+        """
+        return json.dumps(request.model_dump(mode="json", exclude={"user_id"}), sort_keys=True)
+
+    async def _run_analysis(self, request: SymptomRequest) -> SymptomResponse:
+        """
+        Run a single symptom analysis against OpenAI
         """
         try:
             # Create detailed prompt for symptom analysis
@@ -80,6 +223,62 @@ class SymptomCheckerService:
             logger.error(f"Error in symptom analysis: {str(e)}")
             return self._create_error_response(request.user_id, str(e))
 
+    async def stream_symptom_analysis(self, request: SymptomRequest) -> AsyncIterator[Union[PossibleCondition, SymptomResponse]]:
+        """
+        Stream symptom analysis, yielding each possible condition as soon as the
+        model has finished emitting it, followed by the complete SymptomResponse
+        """
+        buffer = ""
+        emitted = 0
+        try:
+            if not self.circuit_breaker.allow():
+                raise CircuitOpenError("OpenAI circuit is open; skipping upstream call")
+            
+            user_prompt = self._create_analysis_prompt(request)
+            
+            stream = await self.client.chat.completions.create(
+                model=self.MODEL,
+                messages=self._build_messages(user_prompt),
+                max_tokens=2000,
+                temperature=0.3,
+                response_format=_ANALYSIS_RESPONSE_FORMAT,
+                stream=True
+            )
+            
+            async for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                delta = chunk.choices[0].delta.content
+                buffer += delta
+                
+                # A condition can only complete on a closing brace or bracket, so skip
+                # re-parsing the whole buffer for every other delta
+                if "}" not in delta and "]" not in delta:
+                    continue
+                
+                # Parse whatever has arrived so far; incomplete strings are dropped
+                partial = jiter.from_json(buffer.encode(), partial_mode=True)
+                if not isinstance(partial, dict):
+                    continue
+                
+                # The last condition may still be streaming until a later key shows up
+                conditions = partial.get("possible_conditions") or []
+                ready = len(conditions) if "first_aid_advice" in partial else len(conditions) - 1
+                while emitted < ready:
+                    yield self._build_condition(conditions[emitted])
+                    emitted += 1
+            
+            self.circuit_breaker.record_success()
+            final_response = self._parse_analysis_response(buffer, request.user_id)
+                    
+        except Exception as e:
+            if isinstance(e, _RETRYABLE_ERRORS):
+                self.circuit_breaker.record_failure()
+            logger.error(f"Error in streaming symptom analysis: {str(e)}")
+            final_response = self._create_error_response(request.user_id, str(e))
+        
+        yield final_response
+
     async def process_chat_message(self, message: ChatMessage) -> ChatResponse:
         """
         Process conversational messages for symptom discussion
@@ -213,70 +412,78 @@ class SymptomCheckerService:
         """
         return prompt
 
+    def _build_messages(self, prompt: str) -> List[Dict[str, str]]:
+        """
+        Build the chat completion message list for a prompt
+        """
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+
     async def _get_ai_response(self, prompt: str, is_chat: bool = False) -> str:
         """
-        Get response from OpenAI API
+        Get response from OpenAI API, retrying transient failures with
+        exponential backoff and jitter behind a circuit breaker
         """
-        try:
-            messages = [
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": prompt}
-            ]
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=messages,
-                max_tokens=2000,
-                temperature=0.3,  # Lower temperature for more consistent medical advice
-                response_format={"type": "json_object"} if not is_chat else None
-            )
-            
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            logger.error(f"Error getting AI response: {str(e)}")
-            raise e
+        if not self.circuit_breaker.allow():
+            raise CircuitOpenError("OpenAI circuit is open; skipping upstream call")
+        
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            try:
+                response = await self.client.chat.completions.create(
+                    model=self.MODEL,
+                    messages=self._build_messages(prompt),
+                    max_tokens=2000,
+                    temperature=0.3,  # Lower temperature for more consistent medical advice
+                    response_format=_ANALYSIS_RESPONSE_FORMAT if not is_chat else None
+                )
+                
+                self.circuit_breaker.record_success()
+                return response.choices[0].message.content
+                
+            except _RETRYABLE_ERRORS as e:
+                if attempt == self.MAX_ATTEMPTS:
+                    self.circuit_breaker.record_failure()
+                    logger.error(f"Error getting AI response after {attempt} attempts: {str(e)}")
+                    raise e
+                
+                delay = min(self.BACKOFF_MAX, self.BACKOFF_INITIAL * 2 ** (attempt - 1))
+                delay += random.uniform(0, self.BACKOFF_INITIAL)
+                logger.warning(f"Transient OpenAI error (attempt {attempt}), retrying in {delay:.2f}s: {str(e)}")
+                await asyncio.sleep(delay)
+                
+            except Exception as e:
+                # Client-side errors (bad request, auth) say nothing about upstream health
+                logger.error(f"Error getting AI response: {str(e)}")
+                raise e
 
     def _parse_analysis_response(self, response: str, user_id: str) -> SymptomResponse:
         """
-        Parse AI response into structured SymptomResponse
+        Parse schema-constrained AI response into structured SymptomResponse
         """
-        try:
-            # Parse JSON response
-            parsed = json.loads(response)
-            
-            # Create PossibleCondition objects
-            possible_conditions = [
-                PossibleCondition(
-                    condition_name=condition["condition_name"],
-                    probability=condition["probability"],
-                    description=condition["description"],
-                    symptoms_match=condition["symptoms_match"],
-                    severity=SeverityLevel(condition["severity"])
-                )
-                for condition in parsed["possible_conditions"]
-            ]
-            
-            # Create FirstAidAdvice object
-            first_aid = FirstAidAdvice(
-                immediate_actions=parsed["first_aid_advice"]["immediate_actions"],
-                do_not_do=parsed["first_aid_advice"]["do_not_do"],
-                when_to_seek_help=parsed["first_aid_advice"]["when_to_seek_help"],
-                emergency_signs=parsed["first_aid_advice"]["emergency_signs"]
-            )
-            
-            return SymptomResponse(
-                user_id=user_id,
-                possible_conditions=possible_conditions,
-                first_aid_advice=first_aid,
-                confidence_score=parsed["confidence_score"],
-                follow_up_questions=parsed["follow_up_questions"],
-                disclaimer=self._get_medical_disclaimer()
-            )
-            
-        except Exception as e:
-            logger.error(f"Error parsing analysis response: {str(e)}")
-            return self._create_error_response(user_id, f"Error parsing AI response: {str(e)}")
+        payload = AnalysisPayload.model_validate_json(response)
+        
+        return SymptomResponse(
+            user_id=user_id,
+            possible_conditions=payload.possible_conditions,
+            first_aid_advice=payload.first_aid_advice,
+            confidence_score=payload.confidence_score,
+            follow_up_questions=payload.follow_up_questions,
+            disclaimer=self._get_medical_disclaimer()
+        )
+
+    def _build_condition(self, condition: Dict[str, Any]) -> PossibleCondition:
+        """
+        Build a PossibleCondition from one parsed condition entry
+        """
+        return PossibleCondition(
+            condition_name=condition["condition_name"],
+            probability=condition["probability"],
+            description=condition["description"],
+            symptoms_match=condition["symptoms_match"],
+            severity=SeverityLevel(condition["severity"])
+        )
 
     def _parse_chat_response(self, response: str, message: ChatMessage) -> ChatResponse:
         """
@@ -303,7 +510,7 @@ class SymptomCheckerService:
                 suggested_questions=suggested_questions,
                 confidence_level=confidence_level,
                 requires_professional_consultation=requires_consultation,
-                session_id=message.session_id or f"session_{message.user_id}_{datetime.now().timestamp()}"
+                session_id=message.session_id or f"session_{message.user_id}_{time.time_ns()}"
             )
             
         except Exception as e:
@@ -316,16 +523,11 @@ class SymptomCheckerService:
         """
         return SymptomResponse(
             user_id=user_id,
-            possible_conditions=[],
-            first_aid_advice=FirstAidAdvice(
-                immediate_actions=["Consult with a healthcare professional"],
-                do_not_do=["Do not ignore persistent symptoms"],
-                when_to_seek_help=["If symptoms persist or worsen"],
-                emergency_signs=["Severe pain, difficulty breathing, chest pain"]
-            ),
+            possible_conditions=(),
+            first_aid_advice=_ERROR_FIRST_AID,
             confidence_score=0.0,
-            follow_up_questions=["Please describe your symptoms again"],
-            disclaimer=self._get_medical_disclaimer()
+            follow_up_questions=_ERROR_FOLLOW_UP_QUESTIONS,
+            disclaimer=_DISCLAIMER
         )
 
     def _create_error_chat_response(self, user_id: str, error_msg: str) -> ChatResponse:
@@ -334,8 +536,8 @@ class SymptomCheckerService:
         """
         return ChatResponse(
             user_id=user_id,
-            response="I apologize, but I'm having trouble processing your message right now. Please try again or consult with a healthcare professional for your health concerns.",
-            suggested_questions=["Could you rephrase your question?", "Would you like to start over?"],
+            response=_ERROR_CHAT_MESSAGE,
+            suggested_questions=_ERROR_CHAT_QUESTIONS,
             confidence_level="low",
             requires_professional_consultation=True,
             session_id=f"error_session_{user_id}"
@@ -345,6 +547,4 @@ class SymptomCheckerService:
         """
         Get standard medical disclaimer
         """
-        return """
-        IMPORTANT: This AI assessment is for educational purposes only and is not a substitute for professional medical advice, diagnosis, or treatment. Always seek the advice of qualified health professionals with any questions about medical conditions. If you have a medical emergency, call emergency services immediately.
-        """
+        return _DISCLAIMER
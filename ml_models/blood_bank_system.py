@@ -5,6 +5,7 @@ import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.neighbors import BallTree
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
 import joblib
@@ -15,15 +16,46 @@ from typing import List, Dict, Tuple, Any, Optional
 from datetime import datetime, timedelta
 import random
 import math
+import re
+import copy
+import functools
+import hashlib
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Vocabulary and IDF weights of the TF-IDF vectorizer fitted on the synthetic corpus
+TFIDF_PARAMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trained_models', 'blood_bank_tfidf.json')
+
+# Keyword rules that settle most real queries without running the classifier
+_REQUEST_TYPE_RULES = [
+    (re.compile(r'\b(urgent|emergency|immediate|critical)\b', re.I), 'urgent_blood_request'),
+    (re.compile(r'\b(schedule|appointment|next|camp|drive)\b', re.I), 'scheduled_donation'),
+    (re.compile(r'\b(surgery|transplant|cancer|operation)\b', re.I), 'emergency_surgery'),
+    (re.compile(r'\b(thalassemia|anemia|sickle|hemophilia|chronic|genetic)\b', re.I), 'chronic_condition')
+]
+
 class BloodBankSystem:
+    EARTH_RADIUS_KM = 6371.0
+    
     def __init__(self, model_path: str = "ml_models/trained_models/"):
         self.model_path = model_path
         self.model = None
         self.vectorizer = None
         
+        # Real queries repeat a lot; cache predictions per raw query string
+        self._predict_cached = functools.lru_cache(maxsize=1024)(self._predict_uncached)
+        
+        # Hospital/inventory data is static between loads, so lookups for the
+        # same place repeat exactly; both caches are cleared by _build_indexes
+        self._nearby_cached = functools.lru_cache(maxsize=128)(self._nearby_uncached)
+        self._availability_cached = functools.lru_cache(maxsize=256)(self._check_blood_availability_uncached)
+        
+        # Distance scratch space, one set per thread so concurrent requests don't share it
+        self._buffers = threading.local()
+        # numpy Generators are not thread-safe; donor matching draws under this lock
+        self._rng_lock = threading.Lock()
+        
         # Blood types and compatibility
         self.blood_types = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
         self.blood_compatibility = {
@@ -51,10 +83,12 @@ class BloodBankSystem:
             'lucknow': {'state': 'Uttar Pradesh', 'lat': 26.8467, 'lon': 80.9462}
         }
         
-        # Initialize hospital and donor data
+        # Initialize hospital and donor data from one seeded generator
+        self._rng = np.random.default_rng(42)
         self.hospitals = self._initialize_hospitals()
         self.donors = self._initialize_donors()
         self.blood_inventory = self._initialize_blood_inventory()
+        self._build_indexes()
         
         # Donor matching categories
         self.donor_categories = [
@@ -70,6 +104,7 @@ class BloodBankSystem:
     
     def _initialize_hospitals(self) -> List[Dict[str, Any]]:
         """Initialize hospital data for Indian cities"""
+        rng = self._rng
         hospitals = []
         hospital_names = [
             'Apollo Hospitals', 'Fortis Healthcare', 'Max Healthcare', 'Manipal Hospitals',
@@ -78,11 +113,22 @@ class BloodBankSystem:
             'Sir Ganga Ram Hospital', 'Indraprastha Apollo', 'BLK Super Speciality',
             'Artemis Hospital', 'Columbia Asia', 'Global Hospitals', 'Rainbow Hospitals'
         ]
+        specialty_options = [
+            'Cardiology', 'Neurology', 'Oncology', 'Orthopedics', 'Pediatrics',
+            'Emergency Medicine', 'Surgery', 'Trauma Care', 'Blood Bank'
+        ]
         
         for city, city_data in self.indian_cities.items():
-            # Add 3-5 hospitals per city
-            num_hospitals = random.randint(3, 5)
-            city_hospitals = random.sample(hospital_names, min(num_hospitals, len(hospital_names)))
+            # Add 3-5 hospitals per city, drawing every field for the city in one batch
+            num_hospitals = int(rng.integers(3, 6))
+            city_hospitals = rng.choice(hospital_names, num_hospitals, replace=False).tolist()
+            lat_offsets = rng.uniform(-0.1, 0.1, num_hospitals).tolist()
+            lon_offsets = rng.uniform(-0.1, 0.1, num_hospitals).tolist()
+            phones = rng.integers(1000000000, 10000000000, (num_hospitals, 2)).tolist()
+            specialty_counts = rng.integers(3, 7, num_hospitals).tolist()
+            bed_capacity = rng.integers(50, 501, num_hospitals).tolist()
+            is_government = (rng.random(num_hospitals) < 0.5).tolist()
+            bank_capacity = rng.integers(100, 1001, num_hospitals).tolist()
             
             for i, hospital_name in enumerate(city_hospitals):
                 hospital = {
@@ -90,18 +136,15 @@ class BloodBankSystem:
                     'name': f'{hospital_name} - {city.title()}',
                     'city': city.title(),
                     'state': city_data['state'],
-                    'latitude': city_data['lat'] + random.uniform(-0.1, 0.1),
-                    'longitude': city_data['lon'] + random.uniform(-0.1, 0.1),
-                    'contact': f'+91-{random.randint(1000000000, 9999999999)}',
-                    'emergency_contact': f'+91-{random.randint(1000000000, 9999999999)}',
-                    'specialties': random.sample([
-                        'Cardiology', 'Neurology', 'Oncology', 'Orthopedics', 'Pediatrics',
-                        'Emergency Medicine', 'Surgery', 'Trauma Care', 'Blood Bank'
-                    ], random.randint(3, 6)),
-                    'bed_capacity': random.randint(50, 500),
-                    'is_government': random.choice([True, False]),
+                    'latitude': city_data['lat'] + lat_offsets[i],
+                    'longitude': city_data['lon'] + lon_offsets[i],
+                    'contact': f'+91-{phones[i][0]}',
+                    'emergency_contact': f'+91-{phones[i][1]}',
+                    'specialties': rng.choice(specialty_options, specialty_counts[i], replace=False).tolist(),
+                    'bed_capacity': bed_capacity[i],
+                    'is_government': is_government[i],
                     'has_blood_bank': True,
-                    'blood_bank_capacity': random.randint(100, 1000)
+                    'blood_bank_capacity': bank_capacity[i]
                 }
                 hospitals.append(hospital)
         
@@ -109,62 +152,162 @@ class BloodBankSystem:
     
     def _initialize_donors(self) -> List[Dict[str, Any]]:
         """Initialize donor database with realistic distribution"""
-        donors = []
+        rng = self._rng
+        num_donors = 1000
         first_names = ['Raj', 'Priya', 'Amit', 'Sneha', 'Vikram', 'Anita', 'Rahul', 'Kavita',
                       'Suresh', 'Meera', 'Arjun', 'Pooja', 'Kumar', 'Sunita', 'Vishal', 'Ritu',
                       'Ravi', 'Shilpa', 'Manoj', 'Geeta', 'Kiran', 'Uma', 'Suresh', 'Lakshmi']
         last_names = ['Sharma', 'Patel', 'Singh', 'Kumar', 'Gupta', 'Agarwal', 'Verma', 'Yadav',
                      'Jain', 'Shah', 'Reddy', 'Nair', 'Iyer', 'Pillai', 'Choudhary', 'Mishra',
                      'Bose', 'Chatterjee', 'Mukherjee', 'Banerjee', 'Das', 'Roy', 'Ghosh', 'Saha']
+        conditions = ['None', 'Diabetes', 'Hypertension', 'Asthma', 'Heart Disease']
         
         # Get all available cities
         available_cities = list(self.indian_cities.keys())
         major_cities = ['delhi', 'mumbai', 'bangalore', 'chennai', 'kolkata', 'hyderabad', 'pune', 'ahmedabad']
-        
-        for i in range(1000):  # 1000 donors
-            # Create realistic distribution: 30% in major cities, 70% in other cities
-            if i < 300:  # First 300 donors in major cities for better distance variety
-                city = random.choice(major_cities)
-            else:
-                city = random.choice(available_cities)
-            
-            donor = {
+        hospital_ids = [h['id'] for h in self.hospitals]
+        
+        # Create realistic distribution: first 300 donors in major cities for
+        # better distance variety, the rest spread over all cities
+        cities = (rng.choice(major_cities, 300).tolist() +
+                  rng.choice(available_cities, num_donors - 300).tolist())
+        
+        # Draw every field for all donors at once
+        first = rng.choice(first_names, num_donors).tolist()
+        last = rng.choice(last_names, num_donors).tolist()
+        ages = rng.integers(18, 66, num_donors).tolist()
+        genders = rng.choice(['Male', 'Female'], num_donors).tolist()
+        blood_types = rng.choice(self.blood_types, num_donors).tolist()
+        phones = rng.integers(1000000000, 10000000000, (num_donors, 2)).tolist()
+        last_days = rng.integers(0, 366, num_donors).tolist()
+        donation_counts = rng.integers(0, 21, num_donors).tolist()
+        available = (rng.random(num_donors) < 0.75).tolist()  # 75% available
+        weights = rng.integers(45, 101, num_donors).tolist()
+        heights = rng.integers(150, 191, num_donors).tolist()
+        
+        # Sampling without replacement per donor: shuffle indices row-wise, keep a prefix
+        preferred = np.argsort(rng.random((num_donors, len(hospital_ids))), axis=1)[:, :3].tolist()
+        preferred_counts = rng.integers(1, 4, num_donors).tolist()
+        donor_conditions = np.argsort(rng.random((num_donors, len(conditions))), axis=1)[:, :2].tolist()
+        condition_counts = rng.integers(1, 3, num_donors).tolist()
+        
+        now = datetime.now()
+        donors = [
+            {
                 'id': f'donor_{i+1}',
-                'name': f'{random.choice(first_names)} {random.choice(last_names)}',
-                'age': random.randint(18, 65),
-                'gender': random.choice(['Male', 'Female']),
-                'blood_type': random.choice(self.blood_types),
-                'city': city.title(),
-                'state': self.indian_cities[city]['state'],
-                'phone': f'+91-{random.randint(1000000000, 9999999999)}',
+                'name': f'{first[i]} {last[i]}',
+                'age': ages[i],
+                'gender': genders[i],
+                'blood_type': blood_types[i],
+                'city': cities[i].title(),
+                'state': self.indian_cities[cities[i]]['state'],
+                'phone': f'+91-{phones[i][0]}',
                 'email': f'donor{i+1}@example.com',
-                'last_donation': datetime.now() - timedelta(days=random.randint(0, 365)),
-                'donation_count': random.randint(0, 20),
-                'is_available': random.choice([True, True, True, False]),  # 75% available
-                'preferred_hospitals': random.sample([h['id'] for h in self.hospitals], random.randint(1, 3)),
-                'emergency_contact': f'+91-{random.randint(1000000000, 9999999999)}',
-                'medical_conditions': random.sample([
-                    'None', 'Diabetes', 'Hypertension', 'Asthma', 'Heart Disease'
-                ], random.randint(1, 2)),
-                'weight': random.randint(45, 100),
-                'height': random.randint(150, 190)
+                # Stored as ISO text, the same form it takes after a save/load round trip
+                'last_donation': (now - timedelta(days=last_days[i])).isoformat(),
+                'donation_count': donation_counts[i],
+                'is_available': available[i],
+                'preferred_hospitals': [hospital_ids[j] for j in preferred[i][:preferred_counts[i]]],
+                'emergency_contact': f'+91-{phones[i][1]}',
+                'medical_conditions': [conditions[j] for j in donor_conditions[i][:condition_counts[i]]],
+                'weight': weights[i],
+                'height': heights[i]
             }
-            donors.append(donor)
+            for i in range(num_donors)
+        ]
         
         return donors
     
     def _initialize_blood_inventory(self) -> Dict[str, Dict[str, int]]:
         """Initialize blood inventory for hospitals"""
-        inventory = {}
+        # Random inventory levels (0-50 units) for every hospital and blood type at once
+        units = self._rng.integers(0, 51, (len(self.hospitals), len(self.blood_types))).tolist()
         
-        for hospital in self.hospitals:
-            hospital_inventory = {}
-            for blood_type in self.blood_types:
-                # Random inventory levels (0-50 units)
-                hospital_inventory[blood_type] = random.randint(0, 50)
-            inventory[hospital['id']] = hospital_inventory
-        
-        return inventory
+        return {
+            hospital['id']: dict(zip(self.blood_types, hospital_units))
+            for hospital, hospital_units in zip(self.hospitals, units)
+        }
+    
+    def _build_indexes(self):
+        """Rebuild the array views used by the query paths after data changes"""
+        self._nearby_cached.cache_clear()
+        self._availability_cached.cache_clear()
+        self._bt_idx = {bt: i for i, bt in enumerate(self.blood_types)}
+        
+        # One bit per blood type (A+ = 1, A- = 2, ..., O- = 128); _compat_mask[requested]
+        # has the bits of every donor type that can give to it
+        self._bt_bit = {bt: 1 << i for i, bt in enumerate(self.blood_types)}
+        self._compat_mask = np.array([
+            sum(self._bt_bit[donor_bt] for donor_bt in self.blood_compatibility.get(requested_bt, []))
+            for requested_bt in self.blood_types
+        ], dtype=np.uint8)
+        
+        self._build_spatial_arrays()
+        self._build_donor_arrays()
+    
+    def _build_spatial_arrays(self):
+        """Stack hospital and donor coordinates (radians) for vectorized distance queries"""
+        self._hosp_lat = np.radians(np.array([h['latitude'] for h in self.hospitals], dtype=np.float64))
+        self._hosp_lon = np.radians(np.array([h['longitude'] for h in self.hospitals], dtype=np.float64))
+        self._hosp_tree = BallTree(np.column_stack([self._hosp_lat, self._hosp_lon]), metric='haversine')
+        
+        # Blood inventory as a (hospital row x blood type column) unit matrix
+        self._inv = np.array([
+            [self.blood_inventory.get(h['id'], {}).get(bt, 0) for bt in self.blood_types]
+            for h in self.hospitals
+        ], dtype=np.int32).reshape(len(self.hospitals), len(self.blood_types))
+        
+        # City centres (radians) by integer index; the trailing NaN slot is
+        # what index -1 (a city missing from indian_cities) resolves to
+        self._city_idx = {city.lower(): i for i, city in enumerate(self.indian_cities)}
+        self._city_lat_arr = np.radians(np.array(
+            [c['lat'] for c in self.indian_cities.values()] + [np.nan], dtype=np.float64))
+        self._city_lon_arr = np.radians(np.array(
+            [c['lon'] for c in self.indian_cities.values()] + [np.nan], dtype=np.float64))
+        
+        # Donors sit on city centres, so donor distance queries go through a
+        # haversine BallTree over the cities themselves
+        self._city_tree = BallTree(np.column_stack([self._city_lat_arr[:-1], self._city_lon_arr[:-1]]),
+                                   metric='haversine')
+    
+    def _build_donor_arrays(self):
+        """Store donor fields as columns and precompute the static eligibility mask"""
+        now = datetime.now()
+        self._d_blood_bit = np.array([self._bt_bit[d['blood_type']] for d in self.donors], dtype=np.uint8)
+        self._d_city_idx = np.array([self._city_idx.get(d['city'].lower(), -1) for d in self.donors], dtype=np.intp)
+        self._d_age = np.array([d['age'] for d in self.donors], dtype=np.int32)
+        self._d_weight = np.array([d['weight'] for d in self.donors], dtype=np.int32)
+        self._d_available = np.array([bool(d['is_available']) for d in self.donors], dtype=bool)
+        self._d_last_days = np.array([self._days_since(d['last_donation'], now) for d in self.donors], dtype=np.int32)
+        
+        # Eligibility never changes between queries: age 18-65, weight >= 50kg, available
+        self._eligible_mask = ((self._d_age >= 18) & (self._d_age <= 65) &
+                               (self._d_weight >= 50) & self._d_available)
+    
+    def _distance_buffers(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-thread scratch arrays for per-city and per-donor distances, reused across queries"""
+        buffers = self._buffers
+        n_cities, n_donors = len(self._city_lat_arr), len(self.donors)
+        if getattr(buffers, 'city_km', None) is None or len(buffers.city_km) != n_cities:
+            buffers.city_km = np.empty(n_cities, dtype=np.float64)
+        if getattr(buffers, 'donor_km', None) is None or len(buffers.donor_km) != n_donors:
+            buffers.donor_km = np.empty(n_donors, dtype=np.float64)
+        return buffers.city_km, buffers.donor_km
+    
+    def _resolve_city(self, user_city: str) -> int:
+        """Index of the user's city, defaulting to Delhi if city not found"""
+        return self._city_idx.get(user_city.lower(), self._city_idx['delhi'])
+    
+    def _days_since(self, last_donation: Any, now: datetime) -> int:
+        """Days since a donor's last donation, accepting datetimes or stored ISO strings"""
+        if isinstance(last_donation, str):
+            try:
+                last_donation = datetime.fromisoformat(last_donation.replace('Z', '+00:00')).replace(tzinfo=None)
+            except ValueError:
+                last_donation = None
+        if last_donation is None:
+            return 30
+        return (now - last_donation).days
     
     def calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """Calculate distance between two coordinates in kilometers"""
@@ -184,164 +327,150 @@ class BloodBankSystem:
     
     def find_nearby_hospitals(self, user_lat: float, user_lon: float, radius_km: float = 50) -> List[Dict[str, Any]]:
         """Find hospitals within specified radius"""
-        nearby_hospitals = []
-        
-        for hospital in self.hospitals:
-            distance = self.calculate_distance(
-                user_lat, user_lon,
-                hospital['latitude'], hospital['longitude']
-            )
-            
-            if distance <= radius_km:
-                hospital_info = hospital.copy()
-                hospital_info['distance_km'] = round(distance, 2)
-                hospital_info['blood_inventory'] = self.blood_inventory[hospital['id']]
-                nearby_hospitals.append(hospital_info)
-        
-        # Sort by distance
-        nearby_hospitals.sort(key=lambda x: x['distance_km'])
-        
-        return nearby_hospitals
+        # Coordinates are quantized to 3 decimals (~100m) so nearby lookups share cache entries
+        hosp_idx, dists = self._nearby_cached(round(user_lat, 3), round(user_lon, 3), float(radius_km))
+        
+        # Only the returned rows are materialized, each built in a single dict display
+        inventory_rows = self._inv[list(hosp_idx)].tolist()
+        return [
+            {
+                **self.hospitals[i],
+                'distance_km': round(distance, 2),
+                'blood_inventory': dict(zip(self.blood_types, units))
+            }
+            for i, distance, units in zip(hosp_idx, dists, inventory_rows)
+        ]
+    
+    def _nearby_uncached(self, user_lat: float, user_lon: float, radius_km: float) -> Tuple[Tuple[int, ...], Tuple[float, ...]]:
+        """Hospital rows and distances within radius as immutable tuples for caching"""
+        hosp_idx, dists = self._hospitals_within(math.radians(user_lat), math.radians(user_lon), radius_km)
+        return tuple(hosp_idx.tolist()), tuple(dists.tolist())
+    
+    def _hospitals_within(self, lat_rad: float, lon_rad: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Hospital row indices and distances (km) within radius of a point in radians, nearest first"""
+        # Radius query on the haversine BallTree
+        ind, dist = self._hosp_tree.query_radius(
+            [[lat_rad, lon_rad]],
+            r=radius_km / self.EARTH_RADIUS_KM,
+            return_distance=True,
+            sort_results=True
+        )
+        return ind[0], dist[0] * self.EARTH_RADIUS_KM
     
     def find_compatible_donors(self, required_blood_type: str, user_city: str, 
                              radius_km: float = 200) -> List[Dict[str, Any]]:
         """Find compatible donors for blood type"""
-        compatible_blood_types = self.blood_compatibility.get(required_blood_type, [])
-        compatible_donors = []
-        
         # Get user coordinates
-        user_city_lower = user_city.lower()
-        if user_city_lower in self.indian_cities:
-            user_lat = self.indian_cities[user_city_lower]['lat']
-            user_lon = self.indian_cities[user_city_lower]['lon']
+        user_idx = self._resolve_city(user_city)
+        user_lat = self._city_lat_arr[user_idx]
+        user_lon = self._city_lon_arr[user_idx]
+        
+        # Eligible donors of every compatible blood type, in donor order:
+        # one bitwise AND over the donor bits replaces per-donor membership tests
+        if required_blood_type in self._bt_idx:
+            compatible = (self._compat_mask[self._bt_idx[required_blood_type]] & self._d_blood_bit) != 0
+            candidates = np.flatnonzero(compatible & self._eligible_mask)
         else:
-            # Default to Delhi if city not found
-            user_lat = self.indian_cities['delhi']['lat']
-            user_lon = self.indian_cities['delhi']['lon']
+            candidates = np.empty(0, dtype=np.intp)
+        same_city = self._d_city_idx[candidates] == self._city_idx.get(user_city.lower(), -2)
         
         # First, add some local donors (same city) for 0km distance
-        local_donors_added = 0
-        for donor in self.donors:
-            if (donor['blood_type'] in compatible_blood_types and 
-                donor['is_available'] and
-                donor['age'] >= 18 and donor['age'] <= 65 and
-                donor['weight'] >= 50 and
-                donor['city'].lower() == user_city_lower and
-                local_donors_added < 3):  # Add 2-3 local donors
-                
-                donor_info = donor.copy()
-                donor_info['distance_km'] = 0.0  # Same city
-                
-                # Handle last_donation date properly
-                last_donation = donor['last_donation']
-                if isinstance(last_donation, str):
-                    try:
-                        from datetime import datetime
-                        last_donation = datetime.fromisoformat(last_donation.replace('Z', '+00:00'))
-                    except:
-                        last_donation = datetime.now() - timedelta(days=30)
-                elif last_donation is None:
-                    last_donation = datetime.now() - timedelta(days=30)
-                
-                donor_info['last_donation_days'] = (datetime.now() - last_donation).days
-                compatible_donors.append(donor_info)
-                local_donors_added += 1
+        local = candidates[same_city][:3]  # Add 2-3 local donors
         
         # Then add donors from other cities
-        for donor in self.donors:
-            if (donor['blood_type'] in compatible_blood_types and 
-                donor['is_available'] and
-                donor['age'] >= 18 and donor['age'] <= 65 and
-                donor['weight'] >= 50 and
-                donor['city'].lower() != user_city_lower):  # Different city
-                
-                # Calculate distance
-                donor_city_lower = donor['city'].lower()
-                if donor_city_lower in self.indian_cities:
-                    donor_lat = self.indian_cities[donor_city_lower]['lat']
-                    donor_lon = self.indian_cities[donor_city_lower]['lon']
-                    distance = self.calculate_distance(user_lat, user_lon, donor_lat, donor_lon)
-                else:
-                    # If donor city not found, assign a random distance within radius
-                    distance = random.uniform(5, radius_km)
-                
-                # Include donors within radius, and some beyond for variety
-                if distance <= radius_km or (distance <= radius_km * 2 and random.random() < 0.4):
-                    donor_info = donor.copy()
-                    donor_info['distance_km'] = round(distance, 2)
-                    
-                    # Handle last_donation date properly
-                    last_donation = donor['last_donation']
-                    if isinstance(last_donation, str):
-                        # If it's a string, parse it
-                        try:
-                            from datetime import datetime
-                            last_donation = datetime.fromisoformat(last_donation.replace('Z', '+00:00'))
-                        except:
-                            # If parsing fails, use a default date
-                            last_donation = datetime.now() - timedelta(days=30)
-                    elif last_donation is None:
-                        last_donation = datetime.now() - timedelta(days=30)
-                    
-                    donor_info['last_donation_days'] = (datetime.now() - last_donation).days
-                    compatible_donors.append(donor_info)
-        
-        # Sort by distance and availability
-        compatible_donors.sort(key=lambda x: (x['distance_km'], -x['last_donation_days']))
-        
-        return compatible_donors[:30]  # Return top 30 matches for more variety
+        others = candidates[~same_city]
+        # Cities beyond twice the radius can never be included, so query only
+        # those; everything else stays at inf, and the trailing NaN slot marks
+        # donors whose city is not in indian_cities
+        ind, dist = self._city_tree.query_radius(
+            [[user_lat, user_lon]], r=2 * radius_km / self.EARTH_RADIUS_KM, return_distance=True
+        )
+        city_km, donor_km = self._distance_buffers()
+        city_km.fill(np.inf)
+        city_km[-1] = np.nan
+        city_km[ind[0]] = dist[0] * self.EARTH_RADIUS_KM
+        distances = np.take(city_km, self._d_city_idx[others], out=donor_km[:len(others)])
+        
+        # If donor city not found, assign a random distance within radius
+        unknown_city = np.isnan(distances)
+        with self._rng_lock:
+            distances[unknown_city] = self._rng.uniform(5, radius_km, int(unknown_city.sum()))
+            variety = self._rng.random(len(others)) < 0.4
+        
+        # Include donors within radius, and some beyond for variety
+        included = (distances <= radius_km) | ((distances <= radius_km * 2) & variety)
+        
+        selected = np.concatenate([local, others[included]])
+        selected_km = np.concatenate([np.zeros(len(local)), np.round(distances[included], 2)])
+        
+        # Sort by distance and availability (longest since last donation first)
+        order = np.lexsort((-self._d_last_days[selected], selected_km))[:30]
+        
+        # Result dicts exist only for the returned rows, read from column views
+        top = selected[order]
+        top_km = selected_km[order].tolist()
+        top_days = self._d_last_days[top].tolist()
+        return [
+            {**self.donors[i], 'distance_km': km, 'last_donation_days': days}
+            for i, km, days in zip(top.tolist(), top_km, top_days)
+        ]  # Top 30 matches for more variety
     
     def check_blood_availability(self, blood_type: str, user_city: str, 
                                radius_km: float = 50) -> Dict[str, Any]:
         """Check blood availability in nearby hospitals"""
-        user_city_lower = user_city.lower()
-        if user_city_lower in self.indian_cities:
-            user_lat = self.indian_cities[user_city_lower]['lat']
-            user_lon = self.indian_cities[user_city_lower]['lon']
+        # Deep copy so callers can't mutate the cached entry
+        availability = copy.deepcopy(self._availability_cached(blood_type, user_city.lower(), float(radius_km)))
+        availability['user_city'] = user_city
+        availability['search_radius_km'] = radius_km
+        return availability
+    
+    def _check_blood_availability_uncached(self, blood_type: str, user_city: str,
+                                           radius_km: float) -> Dict[str, Any]:
+        """Compute blood availability for a normalized (lowercase) city"""
+        user_idx = self._resolve_city(user_city)
+        hosp_idx, dists = self._hospitals_within(self._city_lat_arr[user_idx], self._city_lon_arr[user_idx], radius_km)
+        dists = np.round(dists, 2).tolist()
+        
+        # Units of the requested type at every nearby hospital in one gather
+        if blood_type in self._bt_idx:
+            units = self._inv[hosp_idx, self._bt_idx[blood_type]]
         else:
-            user_lat = self.indian_cities['delhi']['lat']
-            user_lon = self.indian_cities['delhi']['lon']
+            units = np.zeros(len(hosp_idx), dtype=np.int32)
+        with_blood = np.flatnonzero(units > 0)
+        
+        hospitals_with_blood = []
+        for k in with_blood:
+            hospital = self.hospitals[hosp_idx[k]]
+            hospitals_with_blood.append({
+                'hospital_id': hospital['id'],
+                'hospital_name': hospital['name'],
+                'city': hospital['city'],
+                'state': hospital['state'],
+                'distance_km': dists[k],
+                'blood_units_available': int(units[k]),
+                'contact': hospital['contact'],
+                'emergency_contact': hospital['emergency_contact']
+            })
         
-        nearby_hospitals = self.find_nearby_hospitals(user_lat, user_lon, radius_km)
+        # Add emergency contacts for the top 5 nearest hospitals
+        emergency_contacts = []
+        for k, i in enumerate(hosp_idx[:5]):
+            hospital = self.hospitals[i]
+            emergency_contacts.append({
+                'hospital_name': hospital['name'],
+                'emergency_contact': hospital['emergency_contact'],
+                'distance_km': dists[k]
+            })
         
-        availability = {
+        return {
             'requested_blood_type': blood_type,
             'user_city': user_city,
             'search_radius_km': radius_km,
-            'hospitals_with_blood': [],
-            'total_units_available': 0,
-            'nearest_hospital': None,
-            'emergency_contacts': []
+            'hospitals_with_blood': hospitals_with_blood,
+            'total_units_available': int(units.sum()),
+            'nearest_hospital': hospitals_with_blood[0] if hospitals_with_blood else None,
+            'emergency_contacts': emergency_contacts
         }
-        
-        for hospital in nearby_hospitals:
-            blood_units = hospital['blood_inventory'].get(blood_type, 0)
-            if blood_units > 0:
-                hospital_info = {
-                    'hospital_id': hospital['id'],
-                    'hospital_name': hospital['name'],
-                    'city': hospital['city'],
-                    'state': hospital['state'],
-                    'distance_km': hospital['distance_km'],
-                    'blood_units_available': blood_units,
-                    'contact': hospital['contact'],
-                    'emergency_contact': hospital['emergency_contact']
-                }
-                availability['hospitals_with_blood'].append(hospital_info)
-                availability['total_units_available'] += blood_units
-                
-                if availability['nearest_hospital'] is None:
-                    availability['nearest_hospital'] = hospital_info
-        
-        # Add emergency contacts
-        for hospital in nearby_hospitals[:5]:  # Top 5 nearest hospitals
-            availability['emergency_contacts'].append({
-                'hospital_name': hospital['name'],
-                'emergency_contact': hospital['emergency_contact'],
-                'distance_km': hospital['distance_km']
-            })
-        
-        return availability
     
     def create_synthetic_data(self, num_samples: int = 500) -> Tuple[List[str], List[str]]:
         """Create synthetic training data for donor matching"""
@@ -419,10 +548,11 @@ class BloodBankSystem:
                 queries.append(query)
                 categories.append(category)
         
-        # Add variations
+        # Add variations (seeded so the corpus, and so its TF-IDF weights, are fixed)
+        rng = random.Random(42)
         for _ in range(num_samples - len(queries)):
-            category = random.choice(self.donor_categories[:4])
-            base_query = random.choice([
+            category = rng.choice(self.donor_categories[:4])
+            base_query = rng.choice([
                 "I need blood for",
                 "Blood required for",
                 "Blood donation for",
@@ -440,15 +570,14 @@ class BloodBankSystem:
         """Train the blood bank classification model"""
         logger.info("Starting blood bank model training...")
         
-        # Vectorize the text data
-        self.vectorizer = TfidfVectorizer(
-            max_features=500,
-            stop_words='english',
-            ngram_range=(1, 2),
-            lowercase=True
-        )
-        
-        X = self.vectorizer.fit_transform(queries)
+        # Vectorize the text data. The synthetic corpus is fixed, so its vocabulary
+        # and IDF weights are shipped precomputed; fit only when the corpus differs
+        self.vectorizer = self._load_precomputed_vectorizer(self._corpus_sha1(queries))
+        if self.vectorizer is not None:
+            X = self.vectorizer.transform(queries)
+        else:
+            self.vectorizer = self._make_vectorizer()
+            X = self.vectorizer.fit_transform(queries)
         y = categories
         
         # Split the data
@@ -456,9 +585,11 @@ class BloodBankSystem:
             X, y, test_size=0.2, random_state=42, stratify=y
         )
         
-        # Train Random Forest model
-        self.model = RandomForestClassifier(n_estimators=100, random_state=42)
+        # Train Random Forest model; a small, shallow forest is as accurate on
+        # this corpus and much cheaper to predict with
+        self.model = RandomForestClassifier(n_estimators=40, max_depth=8, random_state=42)
         self.model.fit(X_train, y_train)
+        self._predict_cached.cache_clear()
         
         # Test the model
         y_pred = self.model.predict(X_test)
@@ -474,11 +605,95 @@ class BloodBankSystem:
             'model_type': 'RandomForest'
         }
     
+    def _make_vectorizer(self, vocabulary: Optional[Dict[str, int]] = None) -> TfidfVectorizer:
+        """TF-IDF vectorizer used for request classification"""
+        return TfidfVectorizer(
+            max_features=500,
+            stop_words='english',
+            ngram_range=(1, 2),
+            lowercase=True,
+            dtype=np.float32,
+            vocabulary=vocabulary
+        )
+    
+    def _load_precomputed_vectorizer(self, corpus_sha1: str) -> Optional[TfidfVectorizer]:
+        """Build the vectorizer from stored vocabulary/IDF if they match this corpus"""
+        try:
+            with open(TFIDF_PARAMS_PATH, 'r') as f:
+                params = json.load(f)
+        except FileNotFoundError:
+            return None
+        
+        if params.get('corpus_sha1') != corpus_sha1:
+            return None
+        
+        vectorizer = self._make_vectorizer(vocabulary=params['vocabulary'])
+        vectorizer.idf_ = np.array(params['idf'], dtype=np.float32)
+        return vectorizer
+    
+    @staticmethod
+    def _corpus_sha1(queries: List[str]) -> str:
+        """Fingerprint of a training corpus, used to match the shipped vectorizer"""
+        return hashlib.sha1('\n'.join(queries).encode('utf-8')).hexdigest()
+    
+    def export_precomputed_vectorizer(self, queries: List[str], path: str = TFIDF_PARAMS_PATH):
+        """Fit the vectorizer on a corpus and write its vocabulary/IDF; run offline, never while serving"""
+        vectorizer = self._make_vectorizer().fit(queries)
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        params = {
+            'corpus_sha1': self._corpus_sha1(queries),
+            'vocabulary': {term: int(i) for term, i in sorted(vectorizer.vocabulary_.items(), key=lambda kv: kv[1])},
+            'idf': vectorizer.idf_.tolist()
+        }
+        with open(path, 'w') as f:
+            json.dump(params, f, separators=(',', ':'))
+    
     def predict_request_type(self, query: str) -> Dict[str, Any]:
         """Predict blood request type from user query"""
+        # Unambiguous keyword hits skip the classifier; mixed signals fall through to it
+        rule_prediction = self._predict_by_rules(query)
+        if rule_prediction is not None:
+            return rule_prediction
+        
         if self.model is None or self.vectorizer is None:
             self.load_model()
         
+        # Copy so callers can't mutate the cached entry
+        return dict(self._predict_cached(query))
+    
+    def predict_request_types(self, queries: List[str]) -> List[Dict[str, Any]]:
+        """Predict request types for many queries with one vectorizer/classifier pass"""
+        predictions = [self._predict_by_rules(query) for query in queries]
+        pending = [i for i, prediction in enumerate(predictions) if prediction is None]
+        
+        if pending:
+            if self.model is None or self.vectorizer is None:
+                self.load_model()
+            
+            processed = self.vectorizer.transform([queries[i] for i in pending])
+            probabilities = self.model.predict_proba(processed)
+            best = probabilities.argmax(axis=1)
+            for i, label, confidence in zip(pending, self.model.classes_[best], probabilities.max(axis=1)):
+                predictions[i] = {
+                    'request_type': str(label),
+                    'confidence': float(confidence)
+                }
+        
+        return predictions
+    
+    def _predict_by_rules(self, query: str) -> Optional[Dict[str, Any]]:
+        """Keyword-rule prediction, or None when no single category matches"""
+        matched = {category for pattern, category in _REQUEST_TYPE_RULES if pattern.search(query)}
+        if len(matched) != 1:
+            return None
+        return {
+            'request_type': matched.pop(),
+            'confidence': 0.95
+        }
+    
+    def _predict_uncached(self, query: str) -> Dict[str, Any]:
+        """Run the vectorizer and classifier for one query"""
         # Preprocess the query
         processed_query = self.vectorizer.transform([query])
         
@@ -490,20 +705,37 @@ class BloodBankSystem:
         confidence = max(probabilities)
         
         return {
-            'request_type': prediction,
+            'request_type': str(prediction),
             'confidence': float(confidence)
         }
     
     def generate_blood_bank_response(self, query: str, user_context: Dict[str, Any] = None) -> Dict[str, Any]:
         """Generate comprehensive blood bank response"""
         request_prediction = self.predict_request_type(query)
+        return self._build_response(query, request_prediction, self._resolve_context(user_context))
+    
+    def generate_blood_bank_responses(self, queries: List[str],
+                                      user_contexts: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """Generate responses for a batch of queries: one batched classifier pass,
+        with the availability/donor lookups spread over a thread pool"""
+        if user_contexts is None:
+            user_contexts = [None] * len(queries)
+        
+        predictions = self.predict_request_types(queries)
+        
+        # The lookups are NumPy/BallTree work that releases the GIL
+        context_parts = joblib.Parallel(n_jobs=-1, prefer='threads')(
+            joblib.delayed(self._resolve_context)(user_context) for user_context in user_contexts
+        )
         
-        response = {
-            'query': query,
-            'request_type': request_prediction['request_type'],
-            'confidence': request_prediction['confidence'],
-            'timestamp': datetime.now().isoformat()
-        }
+        return [
+            self._build_response(query, prediction, context_part)
+            for query, prediction, context_part in zip(queries, predictions, context_parts)
+        ]
+    
+    def _resolve_context(self, user_context: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Availability, donor and contact sections for a user context"""
+        context_part = {}
         
         if user_context:
             blood_type = user_context.get('blood_type')
@@ -512,19 +744,31 @@ class BloodBankSystem:
             if blood_type:
                 # Check blood availability
                 availability = self.check_blood_availability(blood_type, city)
-                response['blood_availability'] = availability
+                context_part['blood_availability'] = availability
                 
                 # Find compatible donors
                 donors = self.find_compatible_donors(blood_type, city)
-                response['compatible_donors'] = donors[:10]  # Top 10 donors
+                context_part['compatible_donors'] = donors[:10]  # Top 10 donors
             
             # Add emergency contacts
-            response['emergency_contacts'] = {
+            context_part['emergency_contacts'] = {
                 'national_blood_bank': '+91-1800-180-1234',
                 'red_cross_india': '+91-1800-180-1234',
                 'emergency_services': '108'
             }
         
+        return context_part
+    
+    def _build_response(self, query: str, request_prediction: Dict[str, Any],
+                        context_part: Dict[str, Any]) -> Dict[str, Any]:
+        """Assemble the response dict returned by generate_blood_bank_response(s)"""
+        response = {
+            'query': query,
+            'request_type': request_prediction['request_type'],
+            'confidence': request_prediction['confidence'],
+            'timestamp': datetime.now().isoformat()
+        }
+        response.update(context_part)
         return response
     
     def save_model(self):
@@ -537,44 +781,98 @@ class BloodBankSystem:
         # Save the vectorizer
         joblib.dump(self.vectorizer, os.path.join(self.model_path, 'blood_bank_vectorizer.pkl'))
         
-        # Save system data
-        system_data = {
-            'hospitals': self.hospitals,
-            'donors': self.donors,
-            'blood_inventory': self.blood_inventory,
+        # Save system data: numeric and date columns go into one .npz, strings
+        # and the small lookup tables into a compact JSON manifest
+        arrays = {'blood_inventory': self._inv}
+        manifest = {
             'blood_types': self.blood_types,
             'blood_compatibility': self.blood_compatibility,
             'indian_cities': self.indian_cities,
             'donor_categories': self.donor_categories
         }
+        self._pack_columns(self.hospitals, 'hospital', arrays, manifest)
+        self._pack_columns(self.donors, 'donor', arrays, manifest)
         
-        with open(os.path.join(self.model_path, 'blood_bank_data.json'), 'w') as f:
-            json.dump(system_data, f, indent=2, default=str)
+        np.savez(os.path.join(self.model_path, 'blood_bank_data.npz'), **arrays)
+        with open(os.path.join(self.model_path, 'blood_bank_manifest.json'), 'w') as f:
+            json.dump(manifest, f, separators=(',', ':'), default=str)
         
         logger.info(f"Blood bank system saved to {self.model_path}")
     
+    def _pack_columns(self, rows: List[Dict[str, Any]], prefix: str,
+                      arrays: Dict[str, np.ndarray], manifest: Dict[str, Any]):
+        """Split list-of-dict records into typed arrays and JSON-able columns"""
+        fields = list(rows[0]) if rows else []
+        manifest[f'{prefix}_fields'] = fields
+        
+        for field in fields:
+            values = [row.get(field) for row in rows]
+            name = f'{prefix}_{field}'
+            if all(isinstance(v, bool) for v in values):
+                arrays[name] = np.array(values, dtype=bool)
+            elif all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+                arrays[name] = np.array(values)
+            elif all(isinstance(v, datetime) for v in values):
+                arrays[name] = np.array(values, dtype='datetime64[us]')
+            else:
+                manifest[name] = values
+    
+    def _unpack_columns(self, prefix: str, arrays: Any, manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Rebuild list-of-dict records from _pack_columns output"""
+        fields = manifest[f'{prefix}_fields']
+        columns = []
+        for field in fields:
+            name = f'{prefix}_{field}'
+            # tolist() hands back plain Python ints/floats/bools/datetimes
+            columns.append(arrays[name].tolist() if name in arrays else manifest[name])
+        
+        return [dict(zip(fields, values)) for values in zip(*columns)]
+    
     def load_model(self):
         """Load the trained model and system data"""
         try:
             self.model = joblib.load(os.path.join(self.model_path, 'blood_bank_classifier.pkl'))
             self.vectorizer = joblib.load(os.path.join(self.model_path, 'blood_bank_vectorizer.pkl'))
             
-            # Load system data
-            with open(os.path.join(self.model_path, 'blood_bank_data.json'), 'r') as f:
-                system_data = json.load(f)
-                self.hospitals = system_data['hospitals']
-                self.donors = system_data['donors']
-                self.blood_inventory = system_data['blood_inventory']
-                self.blood_types = system_data['blood_types']
-                self.blood_compatibility = system_data['blood_compatibility']
-                self.indian_cities = system_data['indian_cities']
-                self.donor_categories = system_data['donor_categories']
+            # Load system data, falling back to the older pretty-printed JSON dump
+            data_path = os.path.join(self.model_path, 'blood_bank_data.npz')
+            if os.path.exists(data_path):
+                self._load_columnar_data(data_path)
+            else:
+                with open(os.path.join(self.model_path, 'blood_bank_data.json'), 'r') as f:
+                    system_data = json.load(f)
+                    self.hospitals = system_data['hospitals']
+                    self.donors = system_data['donors']
+                    self.blood_inventory = system_data['blood_inventory']
+                    self.blood_types = system_data['blood_types']
+                    self.blood_compatibility = system_data['blood_compatibility']
+                    self.indian_cities = system_data['indian_cities']
+                    self.donor_categories = system_data['donor_categories']
             
+            self._build_indexes()
+            self._predict_cached.cache_clear()
             logger.info("Blood bank system loaded successfully")
         except FileNotFoundError:
             logger.warning("Blood bank system files not found. Training new model...")
             self.train_from_scratch()
     
+    def _load_columnar_data(self, data_path: str):
+        """Load system data written by save_model"""
+        with open(os.path.join(self.model_path, 'blood_bank_manifest.json'), 'r') as f:
+            manifest = json.load(f)
+        
+        with np.load(data_path) as arrays:
+            self.blood_types = manifest['blood_types']
+            self.blood_compatibility = manifest['blood_compatibility']
+            self.indian_cities = manifest['indian_cities']
+            self.donor_categories = manifest['donor_categories']
+            self.hospitals = self._unpack_columns('hospital', arrays, manifest)
+            self.donors = self._unpack_columns('donor', arrays, manifest)
+            self.blood_inventory = {
+                hospital['id']: dict(zip(self.blood_types, units))
+                for hospital, units in zip(self.hospitals, arrays['blood_inventory'].tolist())
+            }
+    
     def train_from_scratch(self):
         """Train a new model from scratch"""
         queries, categories = self.create_synthetic_data()
@@ -588,6 +886,9 @@ if __name__ == "__main__":
     queries, categories = system.create_synthetic_data()
     results = system.train_model(queries, categories)
     
+    # Refresh the shipped vocabulary/IDF for the synthetic corpus
+    system.export_precomputed_vectorizer(queries)
+    
     print("Training completed!")
     print(f"Test accuracy: {results['test_accuracy']:.4f}")
     
@@ -4,21 +4,36 @@ Hospital Recommendation System
 Uses ML to recommend hospitals based on medical issue type, specialties, and real-time data
 """
 import numpy as np
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-import joblib
-import random
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Tuple
 import json
 import math
+import os
+import functools
+from collections import defaultdict
 
 logger = logging.getLogger(__name__)
 
+# Urgency levels, ordered so that higher means more urgent
+URGENCY_LOW, URGENCY_MEDIUM, URGENCY_HIGH, URGENCY_CRITICAL = range(4)
+_URGENCY = {'low': URGENCY_LOW, 'medium': URGENCY_MEDIUM, 'high': URGENCY_HIGH, 'critical': URGENCY_CRITICAL}
+
+# Cosine similarity above which a query takes the label of the closest seeded issue
+ISSUE_MATCH_THRESHOLD = 0.6
+
+# Cities covered by the hospital database; user cities resolve against this list
+MAJOR_CITIES = [
+    {'name': 'Delhi', 'lat': 28.7041, 'lon': 77.1025, 'state': 'Delhi'},
+    {'name': 'Mumbai', 'lat': 19.0760, 'lon': 72.8777, 'state': 'Maharashtra'},
+    {'name': 'Bangalore', 'lat': 12.9716, 'lon': 77.5946, 'state': 'Karnataka'},
+    {'name': 'Chennai', 'lat': 13.0827, 'lon': 77.2707, 'state': 'Tamil Nadu'},
+    {'name': 'Kolkata', 'lat': 22.5726, 'lon': 88.3639, 'state': 'West Bengal'},
+    {'name': 'Hyderabad', 'lat': 17.3850, 'lon': 78.4867, 'state': 'Telangana'},
+    {'name': 'Pune', 'lat': 18.5204, 'lon': 73.8567, 'state': 'Maharashtra'},
+    {'name': 'Ahmedabad', 'lat': 23.0225, 'lon': 72.5714, 'state': 'Gujarat'}
+]
+
 class HospitalRecommender:
     """ML-powered hospital recommendation system"""
     
@@ -30,6 +45,13 @@ class HospitalRecommender:
         self.recommendation_model = None
         self.specialty_vectorizer = None
         self.issue_classifier = None
+        
+        # Medical issues repeat a lot; cache classifications per normalized issue
+        self._classify_cached = functools.lru_cache(maxsize=4096)(self._classify_issue)
+        
+        # Recommendations are deterministic for a given model and database, so whole
+        # results are cached too; cleared whenever either is rebuilt
+        self._recommend_cached = functools.lru_cache(maxsize=512)(self._recommend_uncached)
         self._initialize_data()
         self._train_models()
     
@@ -71,24 +93,106 @@ class HospitalRecommender:
             }
         }
         
+        # (lat, lon, state) per lowercased city name
+        self._city_info = {city['name'].lower(): (city['lat'], city['lon'], city['state']) for city in MAJOR_CITIES}
+        
+        # Seeded generator for the synthetic database; fields are drawn a column at a time
+        self._rng = np.random.default_rng(42)
+        
         # Create comprehensive hospital database
         self._create_hospital_database()
         self._create_doctor_database()
         self._create_medical_issues()
+        self._build_indexes()
+    
+    def _build_indexes(self):
+        """Build struct-of-arrays views of the hospital database for vectorized scoring"""
+        self._recommend_cached.cache_clear()
+        hospitals = self.hospitals
+        self._h_lat = np.array([h['latitude'] for h in hospitals], dtype=np.float64)
+        self._h_lon = np.array([h['longitude'] for h in hospitals], dtype=np.float64)
+        self._h_lat_rad = np.radians(self._h_lat)
+        self._h_lon_rad = np.radians(self._h_lon)
+        # Bounded quality fields fit float32/int16, halving memory traffic when scoring
+        self._h_overall = np.array([h['overall_rating'] for h in hospitals], dtype=np.float32)
+        self._h_equip = np.array([h['equipment_quality'] for h in hospitals], dtype=np.float32)
+        self._h_doc = np.array([h['doctor_expertise'] for h in hospitals], dtype=np.float32)
+        self._h_infra = np.array([h['infrastructure'] for h in hospitals], dtype=np.float32)
+        self._h_sat = np.array([h['patient_satisfaction'] for h in hospitals], dtype=np.float32)
+        self._h_wait = np.array([h['wait_time_minutes'] for h in hospitals], dtype=np.int16)
+        self._h_icu = np.array([h['icu_beds'] for h in hospitals], dtype=np.int16)
+        self._h_emerg = np.array([h['emergency_services'] for h in hospitals], dtype=bool)
+        
+        # Base quality (25%), urgency match (15%) and the emergency bonus (5%) only depend
+        # on the hospital and urgency level, so fold them into one column per level
+        base_score = (
+            self._h_overall * 0.3 +
+            self._h_equip * 0.25 +
+            self._h_doc * 0.3 +  # Emphasize doctor expertise
+            self._h_infra * 0.1 +
+            self._h_sat * 0.05
+        )
+        static_scores = []
+        for urgency in range(len(_URGENCY)):
+            static_score = base_score * 0.25 + self._calculate_urgency_score(urgency) * 0.15
+            if urgency >= URGENCY_HIGH:
+                static_score += self._h_emerg * 0.05
+            static_scores.append(static_score)
+        self._static_score = np.vstack(static_scores).astype(np.float32)
+        
+        # Hospital indices per lowercased state
+        hospitals_by_state = defaultdict(list)
+        for i, h in enumerate(hospitals):
+            hospitals_by_state[h['state'].lower()].append(i)
+        self._hospitals_by_state = {state: np.asarray(ids, dtype=np.int64) for state, ids in hospitals_by_state.items()}
+        
+        # Doctor quality per specialty is fixed per hospital, so precompute it; hospitals
+        # lacking the specialty get 0.1 so their 50% share matches the 0.05 penalty
+        self._sp_mask, self._dq_by_specialty = {}, {}
+        for specialty in self.specialties:
+            details = [h['specialties'].get(specialty) for h in hospitals]
+            mask = np.array([d is not None for d in details], dtype=bool)
+            rating = np.array([d['rating'] if d else 0.0 for d in details], dtype=np.float32)
+            doctors_count = np.array([d['doctors_count'] if d else 0 for d in details], dtype=np.float32)
+            success_rate = np.array([d['success_rate'] if d else 0.0 for d in details], dtype=np.float32)
+            wait_time_days = np.array([d['wait_time_days'] if d else 0 for d in details], dtype=np.float32)
+            doctor_quality_score = (
+                rating * 0.5 +  # Specialty department rating
+                (doctors_count / 10) * 0.3 +  # Number of specialists
+                (success_rate / 100) * 0.4 +  # Success rate
+                (1 - wait_time_days / 30) * 0.1  # Availability
+            )
+            self._sp_mask[specialty] = mask
+            self._dq_by_specialty[specialty] = np.where(mask, doctor_quality_score, np.float32(0.1))
+        
+        self._build_doctor_index()
+    
+    def _build_doctor_index(self):
+        """Score doctors once and keep them pre-sorted per specialty and per hospital"""
+        for doctor in self.doctors:
+            # Calculate doctor quality score
+            doctor['quality_score'] = (
+                doctor['rating'] * 0.4 +  # Rating weight
+                (doctor['experience_years'] / 40) * 0.3 +  # Experience weight
+                (doctor['success_rate'] / 100) * 0.2 +  # Success rate weight
+                (doctor['procedures_performed'] / 1000) * 0.1  # Procedure count weight
+            )
+        
+        # Sort by quality score, then by rating, then by experience
+        order = sorted(
+            range(len(self.doctors)),
+            key=lambda i: (self.doctors[i]['quality_score'], self.doctors[i]['rating'], self.doctors[i]['experience_years']),
+            reverse=True
+        )
+        self._docs_sorted = defaultdict(list)
+        self._docs_by_hospital_and_specialty = defaultdict(list)
+        for i in order:
+            doctor = self.doctors[i]
+            self._docs_sorted[doctor['specialty']].append(i)
+            self._docs_by_hospital_and_specialty[(doctor['hospital_id'], doctor['specialty'])].append(i)
     
     def _create_hospital_database(self):
         """Create comprehensive hospital database with specialties and ratings"""
-        major_cities = [
-            {'name': 'Delhi', 'lat': 28.7041, 'lon': 77.1025, 'state': 'Delhi'},
-            {'name': 'Mumbai', 'lat': 19.0760, 'lon': 72.8777, 'state': 'Maharashtra'},
-            {'name': 'Bangalore', 'lat': 12.9716, 'lon': 77.5946, 'state': 'Karnataka'},
-            {'name': 'Chennai', 'lat': 13.0827, 'lon': 77.2707, 'state': 'Tamil Nadu'},
-            {'name': 'Kolkata', 'lat': 22.5726, 'lon': 88.3639, 'state': 'West Bengal'},
-            {'name': 'Hyderabad', 'lat': 17.3850, 'lon': 78.4867, 'state': 'Telangana'},
-            {'name': 'Pune', 'lat': 18.5204, 'lon': 73.8567, 'state': 'Maharashtra'},
-            {'name': 'Ahmedabad', 'lat': 23.0225, 'lon': 72.5714, 'state': 'Gujarat'}
-        ]
-        
         hospital_names = [
             'Apollo Hospitals', 'Fortis Healthcare', 'Max Healthcare', 'Manipal Hospitals',
             'AIIMS', 'Tata Memorial Hospital', 'Narayana Health', 'Medanta',
@@ -97,91 +201,160 @@ class HospitalRecommender:
             'KEM Hospital', 'Jaslok Hospital', 'Bombay Hospital', 'Wockhardt Hospital'
         ]
         
-        for i, city in enumerate(major_cities):
-            # Create 3-5 hospitals per city
-            num_hospitals = random.randint(3, 5)
-            for j in range(num_hospitals):
+        rng = self._rng
+        
+        # Create 3-5 hospitals per city, then draw every field for all hospitals at once
+        counts = rng.integers(3, 6, len(MAJOR_CITIES)).tolist()
+        n = sum(counts)
+        names = rng.choice(hospital_names, n).tolist()
+        lat_offsets = rng.uniform(-0.1, 0.1, n).tolist()
+        lon_offsets = rng.uniform(-0.1, 0.1, n).tolist()
+        phones = rng.integers(1000000000, 10000000000, (n, 2)).tolist()
+        bed_capacity = rng.integers(50, 501, n).tolist()
+        is_government = (rng.random(n) < 0.5).tolist()
+        has_blood_bank = rng.random(n) < 2 / 3
+        blood_bank_capacity = np.where(has_blood_bank, rng.integers(0, 201, n), 0).tolist()
+        has_blood_bank = has_blood_bank.tolist()
+        overall_rating = np.round(rng.uniform(3.5, 5.0, n), 1).tolist()
+        equipment_quality, doctor_expertise, infrastructure, patient_satisfaction = (
+            np.round(rng.uniform(3.0, 5.0, (4, n)), 1).tolist()
+        )
+        wait_time_minutes = rng.integers(15, 121, n).tolist()
+        cost_level = rng.choice(['Low', 'Medium', 'High'], n).tolist()
+        insurance_accepted = (rng.random(n) < 2 / 3).tolist()
+        emergency_services = (rng.random(n) < 0.75).tolist()
+        icu_beds = rng.integers(5, 51, n).tolist()
+        operation_theaters = rng.integers(2, 16, n).tolist()
+        ambulance_services = (rng.random(n) < 2 / 3).tolist()
+        age_days = rng.integers(1, 3651, n).tolist()
+        specialties = self._assign_specialties(n)
+        
+        now = datetime.now()
+        k = 0
+        for i, city in enumerate(MAJOR_CITIES):
+            for j in range(counts[i]):
                 hospital = {
                     'id': f'hospital_{i}_{j}',
-                    'name': f'{random.choice(hospital_names)} - {city["name"]}',
+                    'name': f'{names[k]} - {city["name"]}',
                     'city': city['name'],
                     'state': city['state'],
-                    'latitude': city['lat'] + random.uniform(-0.1, 0.1),
-                    'longitude': city['lon'] + random.uniform(-0.1, 0.1),
-                    'contact_number': f'+91-{random.randint(1000000000, 9999999999)}',
-                    'emergency_contact': f'+91-{random.randint(1000000000, 9999999999)}',
-                    'bed_capacity': random.randint(50, 500),
-                    'is_government': random.choice([True, False]),
-                    'has_blood_bank': random.choice([True, True, False]),
-                    'blood_bank_capacity': random.randint(0, 200) if random.choice([True, True, False]) else 0,
-                    'overall_rating': round(random.uniform(3.5, 5.0), 1),
-                    'specialties': self._assign_specialties(),
-                    'equipment_quality': round(random.uniform(3.0, 5.0), 1),
-                    'doctor_expertise': round(random.uniform(3.0, 5.0), 1),
-                    'infrastructure': round(random.uniform(3.0, 5.0), 1),
-                    'patient_satisfaction': round(random.uniform(3.0, 5.0), 1),
-                    'wait_time_minutes': random.randint(15, 120),
-                    'cost_level': random.choice(['Low', 'Medium', 'High']),
-                    'insurance_accepted': random.choice([True, True, False]),
-                    'emergency_services': random.choice([True, True, True, False]),
-                    'icu_beds': random.randint(5, 50),
-                    'operation_theaters': random.randint(2, 15),
-                    'ambulance_services': random.choice([True, True, False]),
-                    'created_at': datetime.now() - timedelta(days=random.randint(1, 3650))
+                    'latitude': city['lat'] + lat_offsets[k],
+                    'longitude': city['lon'] + lon_offsets[k],
+                    'contact_number': f'+91-{phones[k][0]}',
+                    'emergency_contact': f'+91-{phones[k][1]}',
+                    'bed_capacity': bed_capacity[k],
+                    'is_government': is_government[k],
+                    'has_blood_bank': has_blood_bank[k],
+                    'blood_bank_capacity': blood_bank_capacity[k],
+                    'overall_rating': overall_rating[k],
+                    'specialties': specialties[k],
+                    'equipment_quality': equipment_quality[k],
+                    'doctor_expertise': doctor_expertise[k],
+                    'infrastructure': infrastructure[k],
+                    'patient_satisfaction': patient_satisfaction[k],
+                    'wait_time_minutes': wait_time_minutes[k],
+                    'cost_level': cost_level[k],
+                    'insurance_accepted': insurance_accepted[k],
+                    'emergency_services': emergency_services[k],
+                    'icu_beds': icu_beds[k],
+                    'operation_theaters': operation_theaters[k],
+                    'ambulance_services': ambulance_services[k],
+                    'created_at': now - timedelta(days=age_days[k])
                 }
                 self.hospitals.append(hospital)
+                k += 1
     
-    def _assign_specialties(self):
-        """Assign specialties to hospitals with realistic distribution"""
+    def _assign_specialties(self, n: int) -> List[Dict[str, Dict[str, Any]]]:
+        """Assign specialties to n hospitals with realistic distribution"""
+        rng = self._rng
         all_specialties = list(self.specialties.keys())
-        num_specialties = random.randint(2, 6)
-        selected_specialties = random.sample(all_specialties, num_specialties)
-        
-        specialty_details = {}
-        for specialty in selected_specialties:
-            specialty_details[specialty] = {
-                'rating': round(random.uniform(3.0, 5.0), 1),
-                'doctors_count': random.randint(1, 10),
-                'procedures_available': random.sample(
-                    self.specialties[specialty]['procedures'], 
-                    random.randint(1, len(self.specialties[specialty]['procedures']))
-                ),
-                'equipment_available': random.sample(
-                    self.specialties[specialty]['equipment'],
-                    random.randint(1, len(self.specialties[specialty]['equipment']))
-                ),
-                'wait_time_days': random.randint(1, 30),
-                'success_rate': round(random.uniform(85, 99), 1)
-            }
+        num_all = len(all_specialties)
+        
+        # Sampling without replacement per hospital: shuffle indices row-wise, keep a prefix
+        selected = np.argsort(rng.random((n, num_all)), axis=1).tolist()
+        num_specialties = rng.integers(2, 7, n).tolist()
+        
+        # One column per specialty, drawn for every hospital
+        ratings = np.round(rng.uniform(3.0, 5.0, (n, num_all)), 1).tolist()
+        doctors_count = rng.integers(1, 11, (n, num_all)).tolist()
+        wait_time_days = rng.integers(1, 31, (n, num_all)).tolist()
+        success_rate = np.round(rng.uniform(85, 99, (n, num_all)), 1).tolist()
+        procedures, equipment = [], []
+        for specialty in all_specialties:
+            options = self.specialties[specialty]
+            procedures.append(self._sample_subsets(options['procedures'], n))
+            equipment.append(self._sample_subsets(options['equipment'], n))
+        
+        assignments = []
+        for i in range(n):
+            specialty_details = {}
+            for s in selected[i][:num_specialties[i]]:
+                specialty_details[all_specialties[s]] = {
+                    'rating': ratings[i][s],
+                    'doctors_count': doctors_count[i][s],
+                    'procedures_available': procedures[s][i],
+                    'equipment_available': equipment[s][i],
+                    'wait_time_days': wait_time_days[i][s],
+                    'success_rate': success_rate[i][s]
+                }
+            assignments.append(specialty_details)
         
-        return specialty_details
+        return assignments
+    
+    def _sample_subsets(self, options: List[str], n: int) -> List[List[str]]:
+        """Draw n random non-empty subsets of options"""
+        rng = self._rng
+        order = np.argsort(rng.random((n, len(options))), axis=1).tolist()
+        sizes = rng.integers(1, len(options) + 1, n).tolist()
+        return [[options[j] for j in order[i][:sizes[i]]] for i in range(n)]
     
     def _create_doctor_database(self):
         """Create doctor database with specialties and expertise"""
+        rng = self._rng
+        num_doctors = 200
         first_names = ['Dr. Rajesh', 'Dr. Priya', 'Dr. Amit', 'Dr. Sneha', 'Dr. Vikram', 'Dr. Kavya',
                       'Dr. Arjun', 'Dr. Pooja', 'Dr. Rahul', 'Dr. Anita', 'Dr. Suresh', 'Dr. Meera']
         last_names = ['Sharma', 'Patel', 'Singh', 'Kumar', 'Gupta', 'Agarwal', 'Verma', 'Yadav',
                      'Jain', 'Shah', 'Reddy', 'Nair', 'Iyer', 'Pillai', 'Choudhary', 'Mishra']
-        
-        for i in range(200):  # 200 doctors
+        languages = ['English', 'Hindi', 'Tamil', 'Telugu', 'Bengali', 'Gujarati']
+        
+        # Draw every field for all doctors at once
+        first = rng.choice(first_names, num_doctors).tolist()
+        last = rng.choice(last_names, num_doctors).tolist()
+        specialty = rng.choice(list(self.specialties.keys()), num_doctors).tolist()
+        subspecialty = rng.choice(['General', 'Pediatric', 'Geriatric', 'Surgical', 'Medical'], num_doctors).tolist()
+        experience_years = rng.integers(2, 41, num_doctors).tolist()
+        qualification = rng.choice(['MBBS', 'MD', 'MS', 'DM', 'MCh', 'DNB'], num_doctors).tolist()
+        hospital_id = rng.choice([h['id'] for h in self.hospitals], num_doctors).tolist()
+        rating = np.round(rng.uniform(3.5, 5.0, num_doctors), 1).tolist()
+        consultation_fee = rng.integers(500, 5001, num_doctors).tolist()
+        availability = rng.choice(['Available', 'Busy', 'On Leave'], num_doctors).tolist()
+        language_order = np.argsort(rng.random((num_doctors, len(languages))), axis=1)[:, :3].tolist()
+        language_counts = rng.integers(1, 4, num_doctors).tolist()
+        procedures_performed = rng.integers(50, 1001, num_doctors).tolist()
+        success_rate = np.round(rng.uniform(85, 99, num_doctors), 1).tolist()
+        research_papers = rng.integers(0, 51, num_doctors).tolist()
+        awards = rng.integers(0, 11, num_doctors).tolist()
+        patient_reviews = rng.integers(10, 501, num_doctors).tolist()
+        
+        for i in range(num_doctors):
             doctor = {
                 'id': f'doctor_{i+1}',
-                'name': f'{random.choice(first_names)} {random.choice(last_names)}',
-                'specialty': random.choice(list(self.specialties.keys())),
-                'subspecialty': random.choice(['General', 'Pediatric', 'Geriatric', 'Surgical', 'Medical']),
-                'experience_years': random.randint(2, 40),
-                'qualification': random.choice(['MBBS', 'MD', 'MS', 'DM', 'MCh', 'DNB']),
-                'hospital_id': random.choice([h['id'] for h in self.hospitals]),
-                'rating': round(random.uniform(3.5, 5.0), 1),
-                'consultation_fee': random.randint(500, 5000),
-                'availability': random.choice(['Available', 'Busy', 'On Leave']),
-                'languages': random.sample(['English', 'Hindi', 'Tamil', 'Telugu', 'Bengali', 'Gujarati'], 
-                                         random.randint(1, 3)),
-                'procedures_performed': random.randint(50, 1000),
-                'success_rate': round(random.uniform(85, 99), 1),
-                'research_papers': random.randint(0, 50),
-                'awards': random.randint(0, 10),
-                'patient_reviews': random.randint(10, 500)
+                'name': f'{first[i]} {last[i]}',
+                'specialty': specialty[i],
+                'subspecialty': subspecialty[i],
+                'experience_years': experience_years[i],
+                'qualification': qualification[i],
+                'hospital_id': hospital_id[i],
+                'rating': rating[i],
+                'consultation_fee': consultation_fee[i],
+                'availability': availability[i],
+                'languages': [languages[j] for j in language_order[i][:language_counts[i]]],
+                'procedures_performed': procedures_performed[i],
+                'success_rate': success_rate[i],
+                'research_papers': research_papers[i],
+                'awards': awards[i],
+                'patient_reviews': patient_reviews[i]
             }
             self.doctors.append(doctor)
     
@@ -221,6 +394,9 @@ class HospitalRecommender:
     
     def _train_models(self):
         """Train ML models for hospital recommendation"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        
         logger.info("Training hospital recommendation models...")
         
         # Prepare training data
@@ -232,156 +408,170 @@ class HospitalRecommender:
             y_specialty.append(issue['specialty'])
         
         # Train specialty classifier
-        self.specialty_vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
+        # The keyword corpus is curated (no stop words) and tiny, so no feature cap is needed
+        self.specialty_vectorizer = TfidfVectorizer(lowercase=True, sublinear_tf=True)
         X_vectorized = self.specialty_vectorizer.fit_transform(X_text)
+        logger.info(f"Specialty vocabulary size: {len(self.specialty_vectorizer.vocabulary_)}")
         
-        self.issue_classifier = RandomForestClassifier(n_estimators=100, random_state=42)
+        # 18 short keyword rows: a linear model predicts with one sparse dot product
+        self.issue_classifier = LogisticRegression(max_iter=1000)
         self.issue_classifier.fit(X_vectorized, y_specialty)
+        self._build_class_matrix()
         
         logger.info("Hospital recommendation models trained successfully")
     
+    def _build_class_matrix(self):
+        """Stack L2-normalized per-specialty TF-IDF centroids for cosine classification"""
+        X_vectorized = self.specialty_vectorizer.transform([issue['keywords'] for issue in self.medical_issues])
+        y_specialty = np.array([issue['specialty'] for issue in self.medical_issues])
+        
+        self._classes = np.unique(y_specialty)
+        class_matrix = np.vstack([
+            np.asarray(X_vectorized[y_specialty == specialty].mean(axis=0)) for specialty in self._classes
+        ]).astype(np.float32)
+        class_matrix /= np.linalg.norm(class_matrix, axis=1, keepdims=True)
+        self._class_matrix = class_matrix
+        
+        # Keep the seeded examples too: a query close to one of them takes its label directly
+        self._issue_matrix = X_vectorized.toarray().astype(np.float32)
+        self._issue_labels = y_specialty
+        self._classify_cached.cache_clear()
+        self._recommend_cached.cache_clear()
+    
     def recommend_hospitals(self, medical_issue: str, user_city: str, 
                           urgency_level: str = 'medium', max_hospitals: int = 10) -> List[Dict[str, Any]]:
         """Recommend hospitals based on medical issue using ML"""
         logger.info(f"Recommending hospitals for: {medical_issue} in {user_city}")
         
+        urgency = _URGENCY.get(str(urgency_level).lower(), URGENCY_MEDIUM)
+        recommendations = self._recommend_cached(
+            medical_issue.lower().strip(), user_city.lower().strip(), urgency, max_hospitals
+        )
+        
+        # Copy so callers can't mutate the cached entries
+        return [dict(hospital) for hospital in recommendations]
+    
+    def _recommend_uncached(self, medical_issue: str, user_city: str, urgency: int,
+                            max_hospitals: int) -> List[Dict[str, Any]]:
+        """Rank hospitals for a normalized medical issue and city"""
         # Classify the medical issue
-        issue_vector = self.specialty_vectorizer.transform([medical_issue])
-        predicted_specialty = self.issue_classifier.predict(issue_vector)[0]
-        specialty_confidence = max(self.issue_classifier.predict_proba(issue_vector)[0])
+        predicted_specialty, specialty_confidence = self._classify_cached(medical_issue)
         
         logger.info(f"Predicted specialty: {predicted_specialty} (confidence: {specialty_confidence:.2f})")
         
         # Get user coordinates and state
-        user_lat, user_lon = self._get_city_coordinates(user_city)
-        user_state = self._get_city_state(user_city)
+        user_lat, user_lon, user_state = self._resolve_city(user_city)
         
         # Filter hospitals by STATE ONLY
-        state_hospitals = [h for h in self.hospitals if h['state'].lower() == user_state.lower()]
+        idx = self._hospitals_by_state.get(user_state.lower(), np.empty(0, dtype=np.int64))
         
-        if not state_hospitals:
+        if idx.size == 0:
             logger.warning(f"No hospitals found in state: {user_state}")
             return []
         
-        logger.info(f"Found {len(state_hospitals)} hospitals in {user_state} state")
+        logger.info(f"Found {idx.size} hospitals in {user_state} state")
         
         # Score and rank hospitals (only from the same state)
-        scored_hospitals = []
+        distances = self._calculate_distances_vec(user_lat, user_lon, idx)
+        scores = self._score_hospitals(idx, predicted_specialty, urgency, distances)
         
-        for hospital in state_hospitals:
-            score = self._calculate_hospital_score(
-                hospital, predicted_specialty, urgency_level, 
-                user_lat, user_lon, medical_issue
-            )
+        # Partially sort so only the top max_hospitals are ordered by score (descending)
+        k = min(max_hospitals, scores.size)
+        if k <= 0:
+            return []
+        top = np.sort(np.argpartition(-scores, k - 1)[:k])
+        top = top[np.argsort(-scores[top], kind='stable')]
+        top = top[scores[top] > 0]  # Only include hospitals with positive scores
+        specialty_match = self._sp_mask[predicted_specialty][idx[top]]
+        
+        # Copy and annotate only the hospitals being returned
+        recommendations = []
+        for rank, (pos, matched) in enumerate(zip(top, specialty_match), start=1):
+            hospital = self.hospitals[idx[pos]]
+            hospital_info = hospital.copy()
+            hospital_info['recommendation_score'] = round(float(scores[pos]), 2)
+            hospital_info['distance_km'] = round(float(distances[pos]), 2)
+            hospital_info['specialty_match'] = bool(matched)
+            hospital_info['urgency_match'] = self._check_urgency_match(idx[pos], urgency)
             
-            if score > 0:  # Only include hospitals with positive scores
-                hospital_info = hospital.copy()
-                hospital_info['recommendation_score'] = round(score, 2)
-                hospital_info['distance_km'] = round(
-                    self._calculate_distance(user_lat, user_lon, 
-                                           hospital['latitude'], hospital['longitude']), 2
-                )
-                hospital_info['specialty_match'] = predicted_specialty in hospital['specialties']
-                hospital_info['urgency_match'] = self._check_urgency_match(hospital, urgency_level)
-                
-                # Add specialty-specific information
-                if predicted_specialty in hospital['specialties']:
-                    specialty_info = hospital['specialties'][predicted_specialty]
-                    hospital_info['specialty_rating'] = specialty_info['rating']
-                    hospital_info['specialty_doctors'] = specialty_info['doctors_count']
-                    hospital_info['specialty_success_rate'] = specialty_info['success_rate']
-                    hospital_info['specialty_wait_time'] = specialty_info['wait_time_days']
-                else:
-                    hospital_info['specialty_rating'] = 0
-                    hospital_info['specialty_doctors'] = 0
-                    hospital_info['specialty_success_rate'] = 0
-                    hospital_info['specialty_wait_time'] = 999
-                
-                scored_hospitals.append(hospital_info)
-        
-        # Sort by recommendation score (descending)
-        scored_hospitals.sort(key=lambda x: x['recommendation_score'], reverse=True)
-        
-        # Return top hospitals
-        recommendations = scored_hospitals[:max_hospitals]
-        
-        # Add recommendation reasoning
-        for i, hospital in enumerate(recommendations):
-            hospital['rank'] = i + 1
-            hospital['recommendation_reason'] = self._generate_recommendation_reason(
-                hospital, predicted_specialty, medical_issue
+            # Add specialty-specific information
+            if matched:
+                specialty_info = hospital['specialties'][predicted_specialty]
+                hospital_info['specialty_rating'] = specialty_info['rating']
+                hospital_info['specialty_doctors'] = specialty_info['doctors_count']
+                hospital_info['specialty_success_rate'] = specialty_info['success_rate']
+                hospital_info['specialty_wait_time'] = specialty_info['wait_time_days']
+            else:
+                hospital_info['specialty_rating'] = 0
+                hospital_info['specialty_doctors'] = 0
+                hospital_info['specialty_success_rate'] = 0
+                hospital_info['specialty_wait_time'] = 999
+            
+            # Add recommendation reasoning
+            hospital_info['rank'] = rank
+            hospital_info['recommendation_reason'] = self._generate_recommendation_reason(
+                hospital_info, predicted_specialty, medical_issue
             )
+            recommendations.append(hospital_info)
         
         logger.info(f"Generated {len(recommendations)} hospital recommendations")
         return recommendations
     
-    def _calculate_hospital_score(self, hospital: Dict, specialty: str, urgency: str,
-                                user_lat: float, user_lon: float, medical_issue: str) -> float:
-        """Calculate comprehensive hospital recommendation score with emphasis on doctor quality"""
-        score = 0.0
-        
+    def _classify_issue(self, issue: str) -> Tuple[str, float]:
+        """Predict the specialty for a normalized medical issue"""
+        issue_vector = self.specialty_vectorizer.transform([issue])
+        
+        # TF-IDF rows are already L2-normalized, so cosine similarity to each class
+        # centroid is a dot product over the query's non-zero terms
+        if issue_vector.nnz:
+            query_weights = issue_vector.data.astype(np.float32)
+            example_similarities = self._issue_matrix[:, issue_vector.indices] @ query_weights
+            best = int(np.argmax(example_similarities))
+            if example_similarities[best] >= ISSUE_MATCH_THRESHOLD:
+                return str(self._issue_labels[best]), float(example_similarities[best])
+            
+            similarities = self._class_matrix[:, issue_vector.indices] @ query_weights
+            best = int(np.argmax(similarities))
+            return str(self._classes[best]), float(similarities[best])
+        
+        # No known keywords: fall back to the classifier's prior
+        probabilities = self.issue_classifier.predict_proba(issue_vector)[0]
+        best = int(np.argmax(probabilities))
+        return str(self.issue_classifier.classes_[best]), float(probabilities[best])
+    
+    def _score_hospitals(self, idx: np.ndarray, specialty: str, urgency: int,
+                         distances: np.ndarray) -> np.ndarray:
+        """Calculate recommendation scores for the hospitals at idx with emphasis on doctor quality"""
         # Doctor Quality and Specialty Expertise (50% - Most Important)
-        if specialty in hospital['specialties']:
-            specialty_data = hospital['specialties'][specialty]
-            # Heavily weight doctor expertise and specialty quality
-            doctor_quality_score = (
-                specialty_data['rating'] * 0.5 +  # Specialty department rating
-                (specialty_data['doctors_count'] / 10) * 0.3 +  # Number of specialists
-                (specialty_data['success_rate'] / 100) * 0.4 +  # Success rate
-                (1 - specialty_data['wait_time_days'] / 30) * 0.1  # Availability
-            )
-            score += doctor_quality_score * 0.5
-        else:
-            score += 0.05  # Heavy penalty for no specialty match
+        score = self._dq_by_specialty[specialty][idx] * 0.5
         
-        # Base hospital quality (25%)
-        base_score = (
-            hospital['overall_rating'] * 0.3 +
-            hospital['equipment_quality'] * 0.25 +
-            hospital['doctor_expertise'] * 0.3 +  # Emphasize doctor expertise
-            hospital['infrastructure'] * 0.1 +
-            hospital['patient_satisfaction'] * 0.05
-        )
-        score += base_score * 0.25
-        
-        # Urgency match (15%)
-        urgency_score = self._calculate_urgency_score(hospital, urgency)
-        score += urgency_score * 0.15
-        
-        # Distance factor (10%) - Prioritize same city
-        distance = self._calculate_distance(user_lat, user_lon, 
-                                          hospital['latitude'], hospital['longitude'])
-        if distance < 50:  # Same city or very close
-            distance_score = 1.0
-        elif distance < 100:  # Nearby city
-            distance_score = 0.8
-        else:  # Far away
-            distance_score = max(0, 1 - (distance / 500))
-        score += distance_score * 0.1
+        # Precomputed base quality, urgency match and emergency bonus
+        score += self._static_score[urgency, idx]
         
-        # Emergency services bonus (5%)
-        if urgency in ['critical', 'high'] and hospital['emergency_services']:
-            score += 0.05
+        # Distance factor (10%) - Prioritize same city, then nearby cities
+        distance_score = np.where(distances < 50, 1.0,
+                                  np.where(distances < 100, 0.8, np.maximum(0, 1 - distances / 500)))
+        score += distance_score * 0.1
         
         return score
     
-    def _calculate_urgency_score(self, hospital: Dict, urgency: str) -> float:
-        """Calculate urgency match score"""
-        if urgency == 'critical':
-            return 1.0 if hospital['emergency_services'] and hospital['icu_beds'] > 10 else 0.5
-        elif urgency == 'high':
-            return 0.8 if hospital['emergency_services'] else 0.6
-        elif urgency == 'medium':
-            return 0.7 if hospital['wait_time_minutes'] < 60 else 0.5
+    def _calculate_urgency_score(self, urgency: int) -> np.ndarray:
+        """Calculate urgency match scores for every hospital"""
+        if urgency == URGENCY_CRITICAL:
+            return np.where(self._h_emerg & (self._h_icu > 10), 1.0, 0.5)
+        elif urgency == URGENCY_HIGH:
+            return np.where(self._h_emerg, 0.8, 0.6)
+        elif urgency == URGENCY_MEDIUM:
+            return np.where(self._h_wait < 60, 0.7, 0.5)
         else:  # low
-            return 0.6
+            return np.full(len(self._h_emerg), 0.6)
     
-    def _check_urgency_match(self, hospital: Dict, urgency: str) -> bool:
-        """Check if hospital matches urgency requirements"""
-        if urgency == 'critical':
-            return hospital['emergency_services'] and hospital['icu_beds'] > 5
-        elif urgency == 'high':
-            return hospital['emergency_services'] or hospital['wait_time_minutes'] < 90
+    def _check_urgency_match(self, i: int, urgency: int) -> bool:
+        """Check if the hospital at index i matches urgency requirements"""
+        if urgency == URGENCY_CRITICAL:
+            return bool(self._h_emerg[i] and self._h_icu[i] > 5)
+        elif urgency == URGENCY_HIGH:
+            return bool(self._h_emerg[i] or self._h_wait[i] < 90)
         else:
             return True
     
@@ -412,37 +602,9 @@ class HospitalRecommender:
         
         return "; ".join(reasons[:3])  # Top 3 reasons
     
-    def _get_city_coordinates(self, city: str) -> Tuple[float, float]:
-        """Get coordinates for a city"""
-        city_coords = {
-            'delhi': (28.7041, 77.1025),
-            'mumbai': (19.0760, 72.8777),
-            'bangalore': (12.9716, 77.5946),
-            'chennai': (13.0827, 77.2707),
-            'kolkata': (22.5726, 88.3639),
-            'hyderabad': (17.3850, 78.4867),
-            'pune': (18.5204, 73.8567),
-            'ahmedabad': (23.0225, 72.5714)
-        }
-        
-        city_lower = city.lower()
-        return city_coords.get(city_lower, city_coords['delhi'])  # Default to Delhi
-    
-    def _get_city_state(self, city: str) -> str:
-        """Get state for a city"""
-        city_state_map = {
-            'delhi': 'Delhi',
-            'mumbai': 'Maharashtra',
-            'bangalore': 'Karnataka',
-            'chennai': 'Tamil Nadu',
-            'kolkata': 'West Bengal',
-            'hyderabad': 'Telangana',
-            'pune': 'Maharashtra',
-            'ahmedabad': 'Gujarat'
-        }
-        
-        city_lower = city.lower()
-        return city_state_map.get(city_lower, 'Delhi')  # Default to Delhi
+    def _resolve_city(self, city: str) -> Tuple[float, float, str]:
+        """Get coordinates and state for a city"""
+        return self._city_info.get(city.lower(), self._city_info['delhi'])  # Default to Delhi
     
     def _calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """Calculate distance between two coordinates in kilometers"""
@@ -460,58 +622,63 @@ class HospitalRecommender:
         
         return distance
     
+    def _calculate_distances_vec(self, user_lat: float, user_lon: float, idx: np.ndarray) -> np.ndarray:
+        """Calculate distances in kilometers from a coordinate to the hospitals at idx"""
+        R = 6371  # Earth's radius in kilometers
+        
+        u_lat = math.radians(user_lat)
+        h_lat = self._h_lat_rad[idx]
+        dlat = h_lat - u_lat
+        dlon = self._h_lon_rad[idx] - math.radians(user_lon)
+        
+        a = np.sin(dlat / 2) ** 2 + math.cos(u_lat) * np.cos(h_lat) * np.sin(dlon / 2) ** 2
+        return R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    
     def get_doctor_recommendations(self, specialty: str, hospital_id: str = None) -> List[Dict[str, Any]]:
         """Get doctor recommendations for a specialty, prioritizing quality"""
-        doctors = [d for d in self.doctors if d['specialty'] == specialty]
-        
         if hospital_id:
-            doctors = [d for d in doctors if d['hospital_id'] == hospital_id]
-        
-        # Enhanced sorting: prioritize by doctor quality score
-        for doctor in doctors:
-            # Calculate doctor quality score
-            quality_score = (
-                doctor['rating'] * 0.4 +  # Rating weight
-                (doctor['experience_years'] / 40) * 0.3 +  # Experience weight
-                (doctor['success_rate'] / 100) * 0.2 +  # Success rate weight
-                (doctor['procedures_performed'] / 1000) * 0.1  # Procedure count weight
-            )
-            doctor['quality_score'] = quality_score
-        
-        # Sort by quality score, then by rating, then by experience
-        doctors.sort(key=lambda x: (x['quality_score'], x['rating'], x['experience_years']), reverse=True)
+            order = self._docs_by_hospital_and_specialty.get((hospital_id, specialty), [])
+        else:
+            order = self._docs_sorted.get(specialty, [])
         
-        return doctors[:10]  # Top 10 doctors
+        return [self.doctors[i] for i in order[:10]]  # Top 10 doctors
     
     def save_models(self, filepath: str = 'ml_models/trained_models/'):
         """Save trained models"""
-        import os
+        import joblib
+        
         os.makedirs(filepath, exist_ok=True)
         
         joblib.dump(self.issue_classifier, f'{filepath}/issue_classifier.pkl')
         joblib.dump(self.specialty_vectorizer, f'{filepath}/specialty_vectorizer.pkl')
         
-        # Save data
-        with open(f'{filepath}/hospitals.json', 'w') as f:
-            json.dump(self.hospitals, f, default=str, indent=2)
-        
-        with open(f'{filepath}/doctors.json', 'w') as f:
-            json.dump(self.doctors, f, default=str, indent=2)
+        # Save data as binary pickles; keeps datetimes intact and loads much faster than JSON
+        joblib.dump(self.hospitals, f'{filepath}/hospitals.joblib', compress=3)
+        joblib.dump(self.doctors, f'{filepath}/doctors.joblib', compress=3)
         
         logger.info(f"Models saved to {filepath}")
     
     def load_models(self, filepath: str = 'ml_models/trained_models/'):
         """Load trained models"""
+        import joblib
+        
         try:
             self.issue_classifier = joblib.load(f'{filepath}/issue_classifier.pkl')
             self.specialty_vectorizer = joblib.load(f'{filepath}/specialty_vectorizer.pkl')
+            self._build_class_matrix()
             
-            with open(f'{filepath}/hospitals.json', 'r') as f:
-                self.hospitals = json.load(f)
-            
-            with open(f'{filepath}/doctors.json', 'r') as f:
-                self.doctors = json.load(f)
+            # Fall back to the older JSON dumps
+            if os.path.exists(f'{filepath}/hospitals.joblib'):
+                self.hospitals = joblib.load(f'{filepath}/hospitals.joblib')
+                self.doctors = joblib.load(f'{filepath}/doctors.joblib')
+            else:
+                with open(f'{filepath}/hospitals.json', 'r') as f:
+                    self.hospitals = json.load(f)
+                
+                with open(f'{filepath}/doctors.json', 'r') as f:
+                    self.doctors = json.load(f)
             
+            self._build_indexes()
             logger.info("Hospital recommendation models loaded successfully")
             return True
         except Exception as e:
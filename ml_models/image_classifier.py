@@ -6,25 +6,72 @@ import numpy as np
 import cv2
 import tensorflow as tf
 from tensorflow import keras
-from tensorflow.keras import layers, models
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from tensorflow.keras.applications import EfficientNetB0, MobileNetV2
+from tensorflow.keras import layers, models, mixed_precision
+from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
 import joblib
 import os
+import shutil
 import logging
-from typing import List, Dict, Tuple, Any
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple, Any, Iterator
 import json
 from PIL import Image
 import io
 
 logger = logging.getLogger(__name__)
 
+# Circles drawn on synthetic images per condition:
+# (count range, radius range, center coordinate range, BGR color[, thickness])
+SYNTHETIC_CIRCLES = {
+    'acne': ((3, 8), (5, 15), (50, 174), (255, 100, 100)),                   # Red spots and bumps
+    'eczema': ((2, 5), (20, 40), (50, 174), (200, 50, 50)),                  # Red, inflamed patches
+    'rash': ((5, 15), (3, 8), (30, 194), (255, 150, 150)),                   # Scattered red spots
+    'burn': ((1, 2), (15, 30), (50, 174), (100, 50, 50)),                    # Burn-like discoloration
+    'bruise': ((1, 2), (20, 35), (50, 174), (100, 50, 150)),                 # Purple/blue discoloration
+    'allergic_reaction': ((3, 7), (8, 18), (50, 174), (255, 100, 100)),      # Red, raised areas
+    'fungal_infection': ((1, 2), (15, 25), (50, 174), (150, 100, 100), 3),   # Ring-like pattern
+    'bacterial_infection': ((1, 2), (10, 20), (50, 174), (255, 255, 200)),   # Pus-like appearance
+    'mole': ((1, 2), (5, 12), (50, 174), (50, 50, 50)),                      # Dark spot
+    'wart': ((1, 2), (8, 15), (50, 174), (200, 180, 160)),                   # Raised, rough texture
+    'hives': ((4, 10), (6, 12), (50, 174), (255, 200, 200)),                 # Raised, itchy welts
+    'rosacea': ((1, 2), (30, 50), (112, 113), (255, 150, 150)),              # Facial redness at the center
+}
+
+# Hue values counted as red: 0-10 and 170-180 on OpenCV's 0-180 hue scale
+RED_HUE_LUT = np.where((np.arange(256) <= 10) | (np.arange(256) >= 170), 255, 0).astype(np.uint8)
+
+@keras.utils.register_keras_serializable(package='skin_classifier')
+class RandomBrightnessScale(layers.Layer):
+    """Scale each training image's brightness by a random factor, like ImageDataGenerator's brightness_range"""
+    def __init__(self, lower: float = 0.8, upper: float = 1.2, **kwargs):
+        super().__init__(**kwargs)
+        self.lower = lower
+        self.upper = upper
+    
+    def call(self, images, training=None):
+        if not training:
+            return images
+        # layers.RandomBrightness shifts additively; this multiplies, as the baseline did
+        factors = tf.random.uniform([tf.shape(images)[0], 1, 1, 1], self.lower, self.upper, dtype=images.dtype)
+        return tf.clip_by_value(images * factors, 0, 255)
+    
+    def get_config(self):
+        config = super().get_config()
+        config.update({'lower': self.lower, 'upper': self.upper})
+        return config
+
 class SkinConditionClassifier:
     def __init__(self, model_path: str = "ml_models/trained_models/"):
         self.model_path = model_path
         self.model = None
+        self._serving_model = None
+        self._serving_fn = None
+        self._infer_fn = None
+        self._interpreter = None
+        self._interpreter_lock = threading.Lock()
         self.class_names = [
             'normal_skin',
             'acne',
@@ -82,18 +129,56 @@ class SkinConditionClassifier:
     def create_model(self, input_shape: Tuple[int, int, int] = (224, 224, 3)) -> keras.Model:
         """Create a CNN model for skin condition classification"""
         
-        # Use EfficientNetB0 as base model
-        base_model = EfficientNetB0(
+        # Mixed precision: float16 compute with float32 weights on GPU tensor
+        # cores. CPUs have no fast float16 path, so they stay in float32. The
+        # policy only applies while layers are built, so it is restored after
+        previous_policy = mixed_precision.global_policy()
+        if self._use_mixed_precision():
+            mixed_precision.set_global_policy('mixed_float16')
+        try:
+            model = self._build_model(input_shape)
+        finally:
+            mixed_precision.set_global_policy(previous_policy)
+        
+        # Compile the model
+        model.compile(
+            optimizer=self._make_optimizer(0.001),
+            loss='categorical_crossentropy',
+            metrics=['accuracy']
+        )
+        
+        return model
+    
+    def _build_model(self, input_shape: Tuple[int, int, int]) -> keras.Model:
+        """Stack the augmentation, backbone and classification head"""
+        # Use MobileNetV2 as base model: depthwise-separable blocks at a fraction
+        # of EfficientNetB0's FLOPs, plenty for the small training set
+        base_model = MobileNetV2(
             weights='imagenet',
             include_top=False,
-            input_shape=input_shape
+            input_shape=input_shape,
+            alpha=0.75
         )
         
         # Freeze base model layers initially
         base_model.trainable = False
         
+        # Augmentation runs inside the model graph on the training device and is
+        # skipped automatically at inference
+        augmentation = models.Sequential([
+            layers.RandomFlip('horizontal'),
+            layers.RandomRotation(20 / 360),
+            layers.RandomZoom(0.2),
+            RandomBrightnessScale(0.8, 1.2),
+            layers.RandomTranslation(0.2, 0.2)
+        ], name='augmentation')
+        
         # Add custom classification head
         model = models.Sequential([
+            layers.Input(shape=input_shape),
+            augmentation,
+            # MobileNetV2 expects inputs scaled to [-1, 1]
+            layers.Rescaling(1.0 / 127.5, offset=-1.0),
             base_model,
             layers.GlobalAveragePooling2D(),
             layers.Dropout(0.2),
@@ -101,152 +186,213 @@ class SkinConditionClassifier:
             layers.Dropout(0.3),
             layers.Dense(256, activation='relu'),
             layers.Dropout(0.2),
-            layers.Dense(len(self.class_names), activation='softmax')
+            # Softmax stays in float32 under mixed precision for a stable loss
+            layers.Dense(len(self.class_names), activation='softmax', dtype='float32')
         ])
         
-        # Compile the model
-        model.compile(
-            optimizer=Adam(learning_rate=0.001),
-            loss='categorical_crossentropy',
-            metrics=['accuracy']
-        )
-        
         return model
     
+    def _use_mixed_precision(self) -> bool:
+        """Whether to train in mixed float16, which only pays off on GPUs"""
+        return bool(tf.config.list_physical_devices('GPU'))
+    
+    def _make_optimizer(self, learning_rate: float) -> keras.optimizers.Optimizer:
+        """Create the Adam optimizer, loss-scaled when training in mixed precision"""
+        optimizer = Adam(learning_rate=learning_rate)
+        if self._use_mixed_precision():
+            # Scale the loss so small float16 gradients don't underflow
+            optimizer = mixed_precision.LossScaleOptimizer(optimizer)
+        return optimizer
+    
     def create_synthetic_data(self, num_samples_per_class: int = 100) -> Tuple[np.ndarray, np.ndarray]:
         """Create synthetic training data for skin conditions"""
         logger.info("Creating synthetic training data...")
         
-        images = []
-        labels = []
-        
-        for class_idx, class_name in enumerate(self.class_names):
-            for i in range(num_samples_per_class):
-                # Generate synthetic image based on condition type
-                image = self._generate_synthetic_image(class_name)
-                images.append(image)
-                labels.append(class_idx)
+        n = num_samples_per_class
+        images = np.empty((len(self.class_names) * n, 224, 224, 3), dtype=np.uint8)
+        for class_idx, batch in enumerate(self._generate_synthetic_classes(n)):
+            images[class_idx * n:(class_idx + 1) * n] = batch
         
-        images = np.array(images)
-        labels = np.array(labels)
+        labels = np.repeat(np.arange(len(self.class_names)), n)
         
         # Convert labels to categorical
         labels = tf.keras.utils.to_categorical(labels, num_classes=len(self.class_names))
         
         return images, labels
     
+    def write_synthetic_tfrecords(self, path: str, n_per_class: int = 100, num_shards: int = 8) -> List[str]:
+        """Write synthetic training data to sharded TFRecord files"""
+        os.makedirs(path, exist_ok=True)
+        shard_paths = [
+            os.path.join(path, f'shards-{shard:05d}-of-{num_shards:05d}.tfrecord')
+            for shard in range(num_shards)
+        ]
+        
+        writers = [tf.io.TFRecordWriter(shard_path) for shard_path in shard_paths]
+        try:
+            example_idx = 0
+            for class_idx, batch in enumerate(self._generate_synthetic_classes(n_per_class)):
+                for image in batch:
+                    # cv2 encodes several times faster than tf.io.encode_png; it writes
+                    # BGR input as RGB, so reverse channels to round-trip unchanged
+                    png = cv2.imencode('.png', image[..., ::-1])[1].tobytes()
+                    example = tf.train.Example(features=tf.train.Features(feature={
+                        'image': tf.train.Feature(bytes_list=tf.train.BytesList(value=[png])),
+                        'label': tf.train.Feature(int64_list=tf.train.Int64List(value=[class_idx]))
+                    }))
+                    
+                    # Round-robin so every shard holds every class
+                    writers[example_idx % num_shards].write(example.SerializeToString())
+                    example_idx += 1
+        finally:
+            for writer in writers:
+                writer.close()
+        
+        logger.info(f"Wrote {example_idx} synthetic images to {num_shards} shards in {path}")
+        return shard_paths
+    
+    def _generate_synthetic_classes(self, n: int) -> Iterator[np.ndarray]:
+        """Yield a batch of n synthetic images per class, in class order"""
+        # Classes are independent, so each is generated in its own process from
+        # a generator seeded by class index, making the data reproducible
+        max_workers = min(os.cpu_count() or 1, len(self.class_names))
+        jobs = [(class_name, n, np.random.default_rng(class_idx)) for class_idx, class_name in enumerate(self.class_names)]
+        
+        if max_workers > 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                yield from executor.map(SkinConditionClassifier._generate_synthetic_batch, *zip(*jobs))
+        else:
+            for job in jobs:
+                yield self._generate_synthetic_batch(*job)
+    
     def _generate_synthetic_image(self, condition: str) -> np.ndarray:
         """Generate synthetic image for a specific skin condition"""
-        # Create base skin tone
-        base_image = np.random.randint(180, 220, (224, 224, 3), dtype=np.uint8)
-        
-        # Add noise for texture
-        noise = np.random.normal(0, 10, (224, 224, 3))
-        base_image = np.clip(base_image + noise, 0, 255).astype(np.uint8)
-        
-        # Add condition-specific features
-        if condition == 'acne':
-            # Add red spots and bumps
-            for _ in range(np.random.randint(3, 8)):
-                center = (np.random.randint(50, 174), np.random.randint(50, 174))
-                cv2.circle(base_image, center, np.random.randint(5, 15), (255, 100, 100), -1)
-        
-        elif condition == 'eczema':
-            # Add red, inflamed patches
-            for _ in range(np.random.randint(2, 5)):
-                center = (np.random.randint(50, 174), np.random.randint(50, 174))
-                cv2.circle(base_image, center, np.random.randint(20, 40), (200, 50, 50), -1)
-        
-        elif condition == 'rash':
-            # Add scattered red spots
-            for _ in range(np.random.randint(5, 15)):
-                center = (np.random.randint(30, 194), np.random.randint(30, 194))
-                cv2.circle(base_image, center, np.random.randint(3, 8), (255, 150, 150), -1)
-        
-        elif condition == 'wound':
+        return self._generate_synthetic_batch(condition, 1)[0]
+    
+    @staticmethod
+    def _generate_synthetic_batch(condition: str, n: int, rng: np.random.Generator = None) -> np.ndarray:
+        """Generate n synthetic images for a specific skin condition"""
+        if rng is None:
+            rng = np.random.default_rng()
+        shape = (n, 224, 224, 3)
+        
+        # Create base skin tone with noise for texture; the random draws dominate
+        # generation time, so they are made for the whole batch in float32
+        images = rng.standard_normal(shape, dtype=np.float32)
+        images *= 10
+        images += rng.integers(180, 220, shape, dtype=np.uint8)
+        np.clip(images, 0, 255, out=images)
+        images = images.astype(np.uint8)
+        
+        for image in images:
+            SkinConditionClassifier._add_condition_features(image, condition, rng)
+            
+            # Add some random variations
+            cv2.GaussianBlur(image, (3, 3), 0, dst=image)
+        
+        return images
+    
+    @staticmethod
+    def _add_condition_features(image: np.ndarray, condition: str, rng: np.random.Generator):
+        """Draw condition-specific features onto an image in place"""
+        if condition == 'wound':
             # Add irregular wound shape
-            points = np.array([
-                [np.random.randint(50, 174), np.random.randint(50, 174)],
-                [np.random.randint(50, 174), np.random.randint(50, 174)],
-                [np.random.randint(50, 174), np.random.randint(50, 174)],
-                [np.random.randint(50, 174), np.random.randint(50, 174)]
-            ], np.int32)
-            cv2.fillPoly(base_image, [points], (150, 100, 100))
-        
-        elif condition == 'burn':
-            # Add burn-like discoloration
-            center = (np.random.randint(50, 174), np.random.randint(50, 174))
-            cv2.circle(base_image, center, np.random.randint(15, 30), (100, 50, 50), -1)
-        
-        elif condition == 'bruise':
-            # Add purple/blue discoloration
-            center = (np.random.randint(50, 174), np.random.randint(50, 174))
-            cv2.circle(base_image, center, np.random.randint(20, 35), (100, 50, 150), -1)
-        
-        elif condition == 'allergic_reaction':
-            # Add red, raised areas
-            for _ in range(np.random.randint(3, 7)):
-                center = (np.random.randint(50, 174), np.random.randint(50, 174))
-                cv2.circle(base_image, center, np.random.randint(8, 18), (255, 100, 100), -1)
-        
-        elif condition == 'fungal_infection':
-            # Add ring-like pattern
-            center = (np.random.randint(50, 174), np.random.randint(50, 174))
-            cv2.circle(base_image, center, np.random.randint(15, 25), (150, 100, 100), 3)
-        
-        elif condition == 'bacterial_infection':
-            # Add pus-like appearance
-            center = (np.random.randint(50, 174), np.random.randint(50, 174))
-            cv2.circle(base_image, center, np.random.randint(10, 20), (255, 255, 200), -1)
-        
-        elif condition == 'mole':
-            # Add dark spot
-            center = (np.random.randint(50, 174), np.random.randint(50, 174))
-            cv2.circle(base_image, center, np.random.randint(5, 12), (50, 50, 50), -1)
-        
-        elif condition == 'wart':
-            # Add raised, rough texture
-            center = (np.random.randint(50, 174), np.random.randint(50, 174))
-            cv2.circle(base_image, center, np.random.randint(8, 15), (200, 180, 160), -1)
-        
-        elif condition == 'hives':
-            # Add raised, itchy welts
-            for _ in range(np.random.randint(4, 10)):
-                center = (np.random.randint(50, 174), np.random.randint(50, 174))
-                cv2.circle(base_image, center, np.random.randint(6, 12), (255, 200, 200), -1)
-        
-        elif condition == 'rosacea':
-            # Add facial redness
-            center = (112, 112)  # Center of image
-            cv2.circle(base_image, center, np.random.randint(30, 50), (255, 150, 150), -1)
-        
-        # Add some random variations
-        base_image = cv2.GaussianBlur(base_image, (3, 3), 0)
-        
-        return base_image
+            points = rng.integers(50, 174, size=(4, 2)).astype(np.int32)
+            cv2.fillPoly(image, [points], (150, 100, 100))
+        
+        elif condition in SYNTHETIC_CIRCLES:
+            SkinConditionClassifier._paint_circles(image, rng, *SYNTHETIC_CIRCLES[condition])
+    
+    @staticmethod
+    def _paint_circles(image: np.ndarray, rng: np.random.Generator, n_range: Tuple[int, int],
+                       r_range: Tuple[int, int], pos_range: Tuple[int, int], color: Tuple[int, int, int],
+                       thickness: int = -1):
+        """Draw a random number of random circles, sampling all their parameters at once"""
+        n = rng.integers(*n_range)
+        centers = rng.integers(*pos_range, size=(n, 2))
+        radii = rng.integers(*r_range, size=n)
+        
+        # cv2.circle rasterises only the circle's own pixels, which beats
+        # building full-frame masks in NumPy for these few small shapes
+        for (cx, cy), r in zip(centers.tolist(), radii.tolist()):
+            cv2.circle(image, (cx, cy), r, color, thickness)
     
     def train_model(self, X: np.ndarray, y: np.ndarray) -> Dict[str, Any]:
         """Train the skin condition classification model"""
         logger.info("Starting model training...")
         
-        # Create the model
-        self.model = self.create_model()
-        
         # Split the data
         from sklearn.model_selection import train_test_split
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=0.2, random_state=42, stratify=np.argmax(y, axis=1)
         )
         
-        # Data augmentation
-        datagen = ImageDataGenerator(
-            rotation_range=20,
-            width_shift_range=0.2,
-            height_shift_range=0.2,
-            horizontal_flip=True,
-            zoom_range=0.2,
-            brightness_range=[0.8, 1.2]
+        # Augmentation is part of the model, so the pipeline only batches
+        train_dataset = (
+            tf.data.Dataset.from_tensor_slices((X_train, y_train))
+            .shuffle(len(X_train))
+            .batch(32)
+            .prefetch(tf.data.AUTOTUNE)
         )
+        test_dataset = tf.data.Dataset.from_tensor_slices((X_test, y_test)).batch(32)
+        
+        return self._fit(train_dataset, test_dataset, calib_data=X_train)
+    
+    def train_from_tfrecords(self, path: str) -> Dict[str, Any]:
+        """Train the model by streaming TFRecord shards written by write_synthetic_tfrecords"""
+        logger.info(f"Starting model training from {path}...")
+        
+        files = sorted(tf.io.gfile.glob(os.path.join(path, 'shards-*.tfrecord')))
+        if len(files) < 2:
+            raise FileNotFoundError(f"Need at least two TFRecord shards in {path}")
+        
+        # Hold out the last shard; shards are written round-robin, so it has every class
+        train_dataset = self._tfrecord_dataset(files[:-1], shuffle=True)
+        test_dataset = self._tfrecord_dataset(files[-1:], shuffle=False)
+        
+        calib_data = np.concatenate([images.numpy() for images, _ in train_dataset.take(4)])
+        
+        return self._fit(train_dataset, test_dataset, calib_data=calib_data)
+    
+    def _tfrecord_dataset(self, files: List[str], shuffle: bool) -> tf.data.Dataset:
+        """Build a batched dataset that decodes examples from TFRecord shards"""
+        num_classes = len(self.class_names)
+        
+        def parse(record):
+            example = tf.io.parse_single_example(record, {
+                'image': tf.io.FixedLenFeature([], tf.string),
+                'label': tf.io.FixedLenFeature([], tf.int64)
+            })
+            image = tf.io.decode_png(example['image'], channels=3)
+            image.set_shape((224, 224, 3))
+            return image, tf.one_hot(example['label'], num_classes)
+        
+        dataset = tf.data.Dataset.from_tensor_slices(files)
+        if shuffle:
+            dataset = dataset.shuffle(len(files))
+        
+        # Read shards in parallel; only a shuffle buffer of examples is held in memory
+        dataset = dataset.interleave(
+            tf.data.TFRecordDataset,
+            num_parallel_calls=tf.data.AUTOTUNE,
+            deterministic=not shuffle
+        )
+        if shuffle:
+            dataset = dataset.shuffle(1024)
+        
+        return (
+            dataset
+            .map(parse, num_parallel_calls=tf.data.AUTOTUNE)
+            .batch(32)
+            .prefetch(tf.data.AUTOTUNE)
+        )
+    
+    def _fit(self, train_dataset: tf.data.Dataset, test_dataset: tf.data.Dataset,
+             calib_data: np.ndarray) -> Dict[str, Any]:
+        """Train a fresh model in two stages, evaluate, save and export it"""
+        # Create the model
+        self.model = self.create_model()
+        self._infer_fn = None
         
         # Callbacks
         callbacks = [
@@ -256,28 +402,66 @@ class SkinConditionClassifier:
         
         # Train the model
         history = self.model.fit(
-            datagen.flow(X_train, y_train, batch_size=32),
-            steps_per_epoch=len(X_train) // 32,
+            train_dataset,
             epochs=50,
-            validation_data=(X_test, y_test),
+            validation_data=test_dataset,
+            callbacks=callbacks,
+            verbose=1
+        )
+        
+        # Fine-tune the top of the backbone at a low learning rate
+        self._unfreeze_top_layers(20)
+        self.model.compile(
+            optimizer=self._make_optimizer(1e-5),
+            loss='categorical_crossentropy',
+            metrics=['accuracy']
+        )
+        
+        fine_tune_history = self.model.fit(
+            train_dataset,
+            epochs=10,
+            validation_data=test_dataset,
             callbacks=callbacks,
             verbose=1
         )
         
+        history_data = {
+            key: values + fine_tune_history.history.get(key, [])
+            for key, values in history.history.items()
+        }
+        
         # Evaluate the model
-        test_loss, test_accuracy = self.model.evaluate(X_test, y_test, verbose=0)
+        test_loss, test_accuracy = self.model.evaluate(test_dataset, verbose=0)
         
         logger.info(f"Test accuracy: {test_accuracy:.4f}")
         
         # Save the model
         self.save_model()
+        if tf.config.list_physical_devices('GPU'):
+            self.convert_to_trt()
+        else:
+            self.quantize_int8(calib_data)
+        
+        # Serve the new export; the runtime loaded before training is stale
+        self._load_serving_runtime()
         
         return {
             'test_accuracy': test_accuracy,
             'test_loss': test_loss,
-            'history': history.history
+            'history': history_data
         }
     
+    def _unfreeze_top_layers(self, num_layers: int):
+        """Make the last layers of the backbone trainable, keeping BatchNorm frozen"""
+        base_model = next(layer for layer in self.model.layers if layer.name.startswith('mobilenetv2'))
+        base_model.trainable = True
+        
+        for layer in base_model.layers[:-num_layers]:
+            layer.trainable = False
+        for layer in base_model.layers[-num_layers:]:
+            if isinstance(layer, layers.BatchNormalization):
+                layer.trainable = False
+    
     def predict_condition(self, image: np.ndarray) -> Dict[str, Any]:
         """Predict skin condition from image"""
         if self.model is None:
@@ -287,12 +471,36 @@ class SkinConditionClassifier:
         processed_image = self.preprocess_image(image)
         
         # Make prediction
-        predictions = self.model.predict(processed_image, verbose=0)
-        prediction_proba = predictions[0]
+        prediction_proba = self._predict_proba(processed_image)[0]
         
         # Get top 3 predictions
         top_indices = np.argsort(prediction_proba)[-3:][::-1]
         
+        return self._format_prediction(prediction_proba, top_indices)
+    
+    def predict_batch(self, images: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """Predict skin conditions for several images with a single model call"""
+        if self.model is None:
+            self.load_model()
+        
+        # Images differ in size, so they are resized to stack them; scaling to
+        # the model's range still happens in the graph
+        batch = np.stack([cv2.resize(image, (224, 224)) for image in images])
+        
+        probabilities = self._predict_proba(batch)
+        
+        # Top 3 per row, then order those 3 by probability
+        top_indices = np.argpartition(probabilities, -3, axis=1)[:, -3:]
+        order = np.argsort(np.take_along_axis(probabilities, top_indices, axis=1), axis=1)[:, ::-1]
+        top_indices = np.take_along_axis(top_indices, order, axis=1)
+        
+        return [
+            self._format_prediction(prediction_proba, indices)
+            for prediction_proba, indices in zip(probabilities, top_indices)
+        ]
+    
+    def _format_prediction(self, prediction_proba: np.ndarray, top_indices: np.ndarray) -> Dict[str, Any]:
+        """Build the prediction result for one image from its class probabilities"""
         results = []
         for idx in top_indices:
             condition = self.class_names[idx]
@@ -311,57 +519,119 @@ class SkinConditionClassifier:
             'primary_condition': results[0] if results else None
         }
     
-    def preprocess_image(self, image: np.ndarray) -> np.ndarray:
-        """Preprocess image for model input"""
-        # Resize to model input size
-        image = cv2.resize(image, (224, 224))
+    def _predict_proba(self, processed_images: np.ndarray) -> np.ndarray:
+        """Run the model on a batch of preprocessed images using the loaded runtime"""
+        if self._serving_fn is not None or self._interpreter is not None:
+            # Exported engines are built for a fixed 224x224 float input
+            processed_images = np.stack([
+                image if image.shape[:2] == (224, 224) else cv2.resize(image, (224, 224))
+                for image in processed_images
+            ]).astype(np.float32)
+            
+            if self._serving_fn is not None:
+                outputs = self._serving_fn(tf.constant(processed_images))
+                return next(iter(outputs.values())).numpy()
+            
+            # The quantized model has a fixed batch size of one
+            return np.stack([self._invoke_interpreter(image[np.newaxis]) for image in processed_images])
         
-        # Normalize pixel values
-        image = image.astype(np.float32) / 255.0
+        if self._infer_fn is None:
+            self._infer_fn = self._build_infer_fn()
+        
+        return self._infer_fn(processed_images).numpy()
+    
+    def _build_forward_fn(self, jit_compile: bool = None):
+        """Trace the model once on 224x224 float input, skipping model.predict's per-call setup"""
+        model = self.model
+        
+        # XLA fuses the backbone's conv/BN/ReLU chains into a few kernels on
+        # GPU; on CPU it loses to the oneDNN kernels, so it is GPU-only
+        if jit_compile is None:
+            jit_compile = bool(tf.config.list_physical_devices('GPU'))
+        
+        @tf.function(
+            input_signature=[tf.TensorSpec((None, 224, 224, 3), tf.float32)],
+            jit_compile=jit_compile
+        )
+        def forward(images):
+            return model(images, training=False)
+        
+        return forward
+    
+    def _build_infer_fn(self):
+        """Trace inference from raw uint8 images of any size"""
+        forward = self._build_forward_fn()
         
-        # Add batch dimension
-        image = np.expand_dims(image, axis=0)
+        # Resizing runs on the device, outside the XLA cluster so every photo
+        # size shares the one compiled model
+        @tf.function(input_signature=[tf.TensorSpec((None, None, None, 3), tf.uint8)])
+        def infer(images):
+            return forward(tf.image.resize(images, (224, 224)))
         
-        return image
+        return infer
+    
+    def _invoke_interpreter(self, processed_image: np.ndarray) -> np.ndarray:
+        """Run the quantized TFLite model, converting to and from its integer types"""
+        input_details = self._interpreter.get_input_details()[0]
+        output_details = self._interpreter.get_output_details()[0]
+        
+        scale, zero_point = input_details['quantization']
+        if scale:
+            info = np.iinfo(input_details['dtype'])
+            processed_image = np.clip(np.round(processed_image / scale + zero_point), info.min, info.max)
+        
+        # The interpreter's tensors are shared state, so requests take turns
+        with self._interpreter_lock:
+            self._interpreter.set_tensor(input_details['index'], processed_image.astype(input_details['dtype']))
+            self._interpreter.invoke()
+            output = self._interpreter.get_tensor(output_details['index'])[0]
+        
+        scale, zero_point = output_details['quantization']
+        if scale:
+            output = (output.astype(np.float32) - zero_point) * scale
+        
+        return output
+    
+    def preprocess_image(self, image: np.ndarray) -> np.ndarray:
+        """Preprocess image for model input"""
+        # Resizing and scaling happen in the graph, so the host only adds a
+        # batch dimension (a view) and ships uint8 bytes to the device
+        return np.expand_dims(image, axis=0)
     
     def detect_features(self, image: np.ndarray) -> List[Dict[str, Any]]:
         """Detect visual features in the image"""
-        features = []
-        
+        return self._extract_all_features(image)
+    
+    def _extract_all_features(self, image: np.ndarray) -> List[Dict[str, Any]]:
+        """Derive every feature map from one color conversion each, then analyse them"""
         # Convert to different color spaces
         hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
-        # Detect redness
-        red_features = self._detect_redness(hsv)
-        features.extend(red_features)
+        # Red hue wraps around 0, so hue goes through a lookup table and only
+        # saturation and value need a range test
+        red_mask = cv2.inRange(hsv, np.array([0, 50, 50]), np.array([255, 255, 255]))
+        cv2.bitwise_and(red_mask, cv2.LUT(cv2.extractChannel(hsv, 0), RED_HUE_LUT), dst=red_mask)
         
-        # Detect texture abnormalities
-        texture_features = self._detect_texture_abnormalities(gray)
-        features.extend(texture_features)
+        # Both gray-derived maps are computed back to back while gray is in cache.
+        # The 8-neighbour Laplacian of uint8 fits in int16 (|x| <= 2040)
+        kernel = np.array([[-1, -1, -1], [-1, 8, -1], [-1, -1, -1]], dtype=np.float32)
+        texture_response = cv2.filter2D(gray, cv2.CV_16S, kernel)
+        edges = cv2.Canny(gray, 50, 150)
         
-        # Detect edges and contours
-        edge_features = self._detect_edges_and_contours(gray)
-        features.extend(edge_features)
+        features = []
+        features.extend(self._detect_redness(red_mask))
+        features.extend(self._detect_texture_abnormalities(texture_response))
+        features.extend(self._detect_edges_and_contours(edges))
         
         return features
     
-    def _detect_redness(self, hsv_image: np.ndarray) -> List[Dict[str, Any]]:
+    def _detect_redness(self, red_mask: np.ndarray) -> List[Dict[str, Any]]:
         """Detect areas of redness in the image"""
         features = []
         
-        # Define range for red colors in HSV
-        lower_red1 = np.array([0, 50, 50])
-        upper_red1 = np.array([10, 255, 255])
-        lower_red2 = np.array([170, 50, 50])
-        upper_red2 = np.array([180, 255, 255])
-        
-        # Create masks for red areas
-        mask1 = cv2.inRange(hsv_image, lower_red1, upper_red1)
-        mask2 = cv2.inRange(hsv_image, lower_red2, upper_red2)
-        red_mask = mask1 + mask2
-        
-        # Find contours
+        # Find contours. Tracing only region borders is cheaper here than
+        # labelling every pixel with connected components
         contours, _ = cv2.findContours(red_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
         for contour in contours:
@@ -379,14 +649,13 @@ class SkinConditionClassifier:
         
         return features
     
-    def _detect_texture_abnormalities(self, gray_image: np.ndarray) -> List[Dict[str, Any]]:
+    def _detect_texture_abnormalities(self, texture_response: np.ndarray) -> List[Dict[str, Any]]:
         """Detect texture abnormalities"""
         features = []
         
-        # Calculate texture using Local Binary Pattern approximation
-        kernel = np.array([[-1, -1, -1], [-1, 8, -1], [-1, -1, -1]])
-        texture_response = cv2.filter2D(gray_image, cv2.CV_64F, kernel)
-        texture_variance = np.var(texture_response)
+        # Texture response is a Local Binary Pattern approximation
+        _, stddev = cv2.meanStdDev(texture_response)
+        texture_variance = float(stddev[0, 0]) ** 2
         
         if texture_variance > 1000:
             confidence = min(texture_variance / 5000, 1.0)
@@ -399,12 +668,12 @@ class SkinConditionClassifier:
         
         return features
     
-    def _detect_edges_and_contours(self, gray_image: np.ndarray) -> List[Dict[str, Any]]:
+    def _detect_edges_and_contours(self, edges: np.ndarray) -> List[Dict[str, Any]]:
         """Detect edges and contours"""
         features = []
         
-        # Edge detection
-        edges = cv2.Canny(gray_image, 50, 150)
+        # Contours rather than connected components: the area test is on the
+        # region an edge encloses, not on its pixel count
         contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
         for contour in contours:
@@ -432,8 +701,15 @@ class SkinConditionClassifier:
         """Save the trained model"""
         os.makedirs(self.model_path, exist_ok=True)
         
-        # Save the model
-        self.model.save(os.path.join(self.model_path, 'skin_classifier.h5'))
+        # Save the model as a SavedModel directory, with the traced inference
+        # function as its serving signature. It is left un-jitted so TF-TRT can
+        # convert it; serving runtimes apply their own compilation
+        serving_fn = self._build_forward_fn(jit_compile=False)
+        self.model.save(
+            os.path.join(self.model_path, 'skin_classifier'),
+            save_format='tf',
+            signatures={'serving_default': serving_fn.get_concrete_function()}
+        )
         
         # Save class names and metadata
         metadata = {
@@ -447,10 +723,119 @@ class SkinConditionClassifier:
         
         logger.info(f"Model saved to {self.model_path}")
     
+    def convert_to_trt(self) -> str:
+        """Convert the trained model to a TF-TRT FP16 SavedModel for GPU inference"""
+        saved_model_dir = os.path.join(self.model_path, 'skin_classifier')
+        trt_path = os.path.join(self.model_path, 'skin_classifier_trt')
+        
+        # An engine left over from an earlier model would disagree with the SavedModel
+        if os.path.isdir(trt_path):
+            shutil.rmtree(trt_path)
+        
+        try:
+            from tensorflow.python.compiler.tensorrt import trt_convert as trt
+            
+            converter = trt.TrtGraphConverterV2(
+                input_saved_model_dir=saved_model_dir,
+                precision_mode=trt.TrtPrecisionMode.FP16,
+                maximum_cached_engines=1
+            )
+            converter.convert()
+            
+            # Build the engine up front so the first request doesn't pay for it
+            def input_fn():
+                yield (np.zeros((1, 224, 224, 3), np.float32),)
+            
+            converter.build(input_fn=input_fn)
+            converter.save(trt_path)
+        except (ImportError, RuntimeError) as e:
+            logger.warning(f"TensorRT conversion unavailable: {e}")
+            return None
+        
+        logger.info(f"TensorRT FP16 model saved to {trt_path}")
+        return trt_path
+    
+    def quantize_int8(self, calib_data: np.ndarray) -> str:
+        """Quantize the model to a full-integer INT8 TFLite model for CPU inference"""
+        tflite_path = os.path.join(self.model_path, 'skin_classifier_int8.tflite')
+        
+        # A model left over from an earlier training run would disagree with the SavedModel
+        if os.path.exists(tflite_path):
+            os.remove(tflite_path)
+        
+        def representative_dataset():
+            # Calibrate on exactly what the exported model is fed
+            for image in calib_data[:100]:
+                yield [cv2.resize(image, (224, 224)).astype(np.float32)[np.newaxis]]
+        
+        try:
+            converter = tf.lite.TFLiteConverter.from_keras_model(self.model)
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = representative_dataset
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.uint8
+            tflite_model = converter.convert()
+        except Exception as e:
+            logger.warning(f"INT8 quantization failed: {e}")
+            return None
+        
+        with open(tflite_path, 'wb') as f:
+            f.write(tflite_model)
+        
+        logger.info(f"INT8 model saved to {tflite_path}")
+        return tflite_path
+    
+    def export_tflite_gpu(self) -> str:
+        """Export a float16 TFLite model for on-device inference with the GPU delegate"""
+        # On Android, load it with the delegate tuned for single-image latency:
+        #   Interpreter.Options().addDelegate(new GpuDelegate(new GpuDelegate.Options()
+        #       .setInferencePreference(GpuDelegate.Options.INFERENCE_PREFERENCE_FAST_SINGLE_ANSWER)
+        #       .setPrecisionLossAllowed(true)))
+        # The graph is a plain classification head, so the delegate takes all of it.
+        converter = tf.lite.TFLiteConverter.from_keras_model(self.model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+        tflite_model = converter.convert()
+        
+        tflite_path = os.path.join(self.model_path, 'skin_classifier_fp16.tflite')
+        with open(tflite_path, 'wb') as f:
+            f.write(tflite_model)
+        
+        logger.info(f"FP16 GPU model saved to {tflite_path}")
+        return tflite_path
+    
+    def _load_serving_runtime(self):
+        """Pick the exported runtime for this host: TensorRT on GPU, INT8 TFLite on CPU"""
+        self._serving_model = None
+        self._serving_fn = None
+        self._interpreter = None
+        
+        trt_path = os.path.join(self.model_path, 'skin_classifier_trt')
+        tflite_path = os.path.join(self.model_path, 'skin_classifier_int8.tflite')
+        
+        if tf.config.list_physical_devices('GPU'):
+            # INT8 is often slower than FP16 on GPUs, so it is only used on CPU
+            if os.path.isdir(trt_path):
+                # Keep the loaded object alive; the signature doesn't own its variables
+                self._serving_model = tf.saved_model.load(trt_path)
+                self._serving_fn = self._serving_model.signatures['serving_default']
+                logger.info("Using TensorRT FP16 engine for inference")
+        elif os.path.exists(tflite_path):
+            self._interpreter = tf.lite.Interpreter(model_path=tflite_path)
+            self._interpreter.allocate_tensors()
+            logger.info("Using INT8 TFLite model for inference")
+    
     def load_model(self):
         """Load the trained model"""
         try:
-            self.model = keras.models.load_model(os.path.join(self.model_path, 'skin_classifier.h5'))
+            model_file = os.path.join(self.model_path, 'skin_classifier')
+            if not os.path.isdir(model_file):
+                # Models trained before the switch to SavedModel
+                model_file += '.h5'
+                if not os.path.exists(model_file):
+                    raise FileNotFoundError(model_file)
+            
+            self.model = keras.models.load_model(model_file)
             
             # Load metadata
             with open(os.path.join(self.model_path, 'skin_classifier_metadata.json'), 'r') as f:
@@ -459,6 +844,8 @@ class SkinConditionClassifier:
                 self.condition_descriptions = metadata['condition_descriptions']
                 self.severity_levels = metadata['severity_levels']
             
+            self._infer_fn = None
+            self._load_serving_runtime()
             logger.info("Model loaded successfully")
         except FileNotFoundError:
             logger.warning("Model files not found. Training new model...")
@@ -466,8 +853,9 @@ class SkinConditionClassifier:
     
     def train_from_scratch(self):
         """Train a new model from scratch"""
-        X, y = self.create_synthetic_data()
-        self.train_model(X, y)
+        data_path = os.path.join(self.model_path, 'synthetic_data')
+        self.write_synthetic_tfrecords(data_path)
+        self.train_from_tfrecords(data_path)
 
 # Training script
 if __name__ == "__main__":
@@ -3,26 +3,36 @@ Nutrition Classification ML Model
 Trained to provide dietary recommendations, meal planning, and nutrition advice
 """
 import numpy as np
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.metrics import classification_report, accuracy_score
+from datetime import datetime, timezone
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
 import joblib
-import json
 import os
 import logging
-from typing import List, Dict, Tuple, Any
+import functools
+import itertools
+from typing import List, Dict, Tuple, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
 import re
 
 logger = logging.getLogger(__name__)
 
+_EXEC = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+_TOK = re.compile(r"(?u)\b\w\w+\b")
+_STOP = frozenset(ENGLISH_STOP_WORDS)
+
+def _tokenize(text: str) -> List[str]:
+    """Lowercase, split into word tokens and drop English stop words"""
+    return [w for w in _TOK.findall(text.lower()) if w not in _STOP]
+
 class NutritionClassifier:
     def __init__(self, model_path: str = "ml_models/trained_models/"):
         self.model_path = model_path
         self.model = None
         self.vectorizer = None
+        self._predictor = None
+        self._predict_cached = functools.lru_cache(maxsize=4096)(self._predict_uncached)
         self.nutrition_categories = [
             'weight_loss',
             'weight_gain',
@@ -207,14 +217,18 @@ class NutritionClassifier:
                 'snacks': 'Raw vegetables with hummus, small apple'
             }
         }
+        
+        # Response parts are constant per category, so every prediction
+        # shares one frozen template instead of rebuilding it
+        self._response_templates = {
+            category: self._response_template(category)
+            for category in self.nutrition_categories
+        }
     
     def create_synthetic_data(self, num_samples: int = 1000) -> Tuple[List[str], List[str]]:
         """Create synthetic training data for nutrition classification"""
         logger.info("Creating synthetic nutrition training data...")
         
-        queries = []
-        categories = []
-        
         # Weight loss queries
         weight_loss_queries = [
             "I want to lose weight, what should I eat?",
@@ -309,39 +323,61 @@ class NutritionClassifier:
             (general_health_queries, 'general_health')
         ]
         
-        for query_list, category in all_queries:
-            for query in query_list:
-                queries.append(query)
-                categories.append(category)
-        
-        # Add variations and additional samples
-        for _ in range(num_samples - len(queries)):
-            category = np.random.choice(self.nutrition_categories[:6])  # Use first 6 categories
-            base_query = np.random.choice([
-                "What should I eat for",
-                "How to eat for",
-                "Best foods for",
-                "Nutrition advice for",
-                "Diet plan for",
-                "Meal ideas for"
-            ])
-            
-            query = f"{base_query} {category.replace('_', ' ')}"
-            queries.append(query)
-            categories.append(category)
+        queries = list(itertools.chain.from_iterable(query_list for query_list, _ in all_queries))
+        categories = list(itertools.chain.from_iterable(
+            [category] * len(query_list) for query_list, category in all_queries
+        ))
+        
+        # Add variations and additional samples, drawn in one batch
+        rng = np.random.default_rng(42)
+        n = max(num_samples - len(queries), 0)
+        extra_categories = rng.choice(self.nutrition_categories[:6], size=n)  # Use first 6 categories
+        base_queries = rng.choice([
+            "What should I eat for",
+            "How to eat for",
+            "Best foods for",
+            "Nutrition advice for",
+            "Diet plan for",
+            "Meal ideas for"
+        ], size=n)
+        
+        queries.extend(
+            f"{base_query} {category.replace('_', ' ')}"
+            for base_query, category in zip(base_queries.tolist(), extra_categories.tolist())
+        )
+        categories.extend(extra_categories.tolist())
         
         return queries, categories
     
-    def train_model(self, queries: List[str], categories: List[str]) -> Dict[str, Any]:
+    def train_model(self, queries: List[str], categories: List[str],
+                    compare_models: bool = False) -> Dict[str, Any]:
         """Train the nutrition classification model"""
         logger.info("Starting nutrition model training...")
         
-        # Vectorize the text data
-        self.vectorizer = TfidfVectorizer(
-            max_features=1000,
-            stop_words='english',
-            ngram_range=(1, 2),
-            lowercase=True
+        # Training-only dependencies are imported here so serving a saved
+        # model doesn't pay for them at startup
+        from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+        from sklearn.pipeline import make_pipeline
+        from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.model_selection import train_test_split, cross_val_score
+        from sklearn.metrics import classification_report, accuracy_score
+        
+        # Vectorize the text data. Hashing needs no vocabulary, so only the
+        # IDF vector is fitted and pickled. float32 features are plenty for
+        # TF-IDF weights and halve the memory the matrices take
+        self.vectorizer = make_pipeline(
+            HashingVectorizer(
+                n_features=2 ** 12,
+                tokenizer=_tokenize,
+                token_pattern=None,
+                ngram_range=(1, 2),
+                lowercase=False,
+                alternate_sign=False,
+                norm=None,
+                dtype=np.float32
+            ),
+            TfidfTransformer(sublinear_tf=True)
         )
         
         X = self.vectorizer.fit_transform(queries)
@@ -352,20 +388,38 @@ class NutritionClassifier:
             X, y, test_size=0.2, random_state=42, stratify=y
         )
         
-        # Try different models
+        # The queries are short, distinct phrases that a linear model separates
+        # as well as the tree ensembles, at the cost of one sparse matmul. Weak
+        # regularisation keeps its confidence from collapsing towards chance
+        # (1/6), which users see next to every answer
         models = {
-            'random_forest': RandomForestClassifier(n_estimators=100, random_state=42),
-            'gradient_boosting': GradientBoostingClassifier(n_estimators=100, random_state=42),
-            'logistic_regression': LogisticRegression(random_state=42, max_iter=1000)
+            'logistic_regression': LogisticRegression(
+                C=10.0, max_iter=1000, random_state=42
+            )
         }
         
+        # Try the tree ensembles too when asked
+        if compare_models:
+            models.update({
+                # Shallow trees are plenty for short queries and keep inference cheap
+                'random_forest': RandomForestClassifier(
+                    n_estimators=64, max_depth=8, min_samples_leaf=5, random_state=42, n_jobs=-1
+                ),
+                # Kept over HistGradientBoostingClassifier: histogram boosting needs
+                # dense input and scans all 4096 hashed features at every split,
+                # which made model comparison ~30x slower on these sparse queries
+                'gradient_boosting': GradientBoostingClassifier(
+                    n_estimators=64, max_depth=4, random_state=42, init='zero'
+                )
+            })
+        
         best_model = None
         best_score = 0
         best_model_name = ''
         
         for name, model in models.items():
             # Cross-validation
-            cv_scores = cross_val_score(model, X_train, y_train, cv=5)
+            cv_scores = cross_val_score(model, X_train, y_train, cv=5, n_jobs=-1)
             mean_score = cv_scores.mean()
             
             logger.info(f"{name} CV score: {mean_score:.4f}")
@@ -385,9 +439,22 @@ class NutritionClassifier:
         logger.info(f"Best model: {best_model_name}")
         logger.info(f"Test accuracy: {test_accuracy:.4f}")
         
+        # Refit on every query for serving, so none of the hand-written
+        # phrasings is left out with the test split
+        best_model.fit(X, y)
+        
+        # Serve the linear model in the same precision as the features; tree
+        # thresholds are quantized when the ensemble is compiled instead
+        if isinstance(best_model, LogisticRegression):
+            best_model.coef_ = best_model.coef_.astype(np.float32)
+            best_model.intercept_ = best_model.intercept_.astype(np.float32)
+        
         # Save the model
         self.model = best_model
         self.save_model()
+        self.compile_model()
+        self._predictor = self._load_predictor()
+        self._predict_cached.cache_clear()
         
         return {
             'model_name': best_model_name,
@@ -401,27 +468,90 @@ class NutritionClassifier:
         if self.model is None or self.vectorizer is None:
             self.load_model()
         
-        # Preprocess the query
-        processed_query = self.vectorizer.transform([query])
+        # Tokenization ignores case and whitespace, so the cache key does too.
+        # Callers get their own copy, which they are free to extend
+        normalized_query = re.sub(r'\s+', ' ', query.strip().lower())
+        return dict(self._predict_cached(normalized_query))
+    
+    def _predict_uncached(self, query: str) -> Dict[str, Any]:
+        """Run the vectorizer and model for a normalized query"""
+        return self._predict(self.vectorizer.transform([query]))
+    
+    def _predict(self, X) -> Dict[str, Any]:
+        """Predict the category for a single vectorized query"""
+        # One probability pass; the most probable class is what predict() returns
+        proba = self._predict_proba(X)[0]
+        idx = int(np.argmax(proba))
+        return self._build_prediction(self.model.classes_[idx], proba[idx])
+    
+    def predict_batch(self, queries: List[str]) -> List[Dict[str, Any]]:
+        """Predict nutrition categories for several queries with one vectorizer and model call"""
+        if self.model is None or self.vectorizer is None:
+            self.load_model()
         
-        # Make prediction
-        prediction = self.model.predict(processed_query)[0]
-        probabilities = self.model.predict_proba(processed_query)[0]
+        return self._predict_vectors(self.vectorizer.transform(queries))
+    
+    def predict_batch_async(self, queries: List[str]) -> List[Dict[str, Any]]:
+        """Predict a large batch by scoring row chunks on a thread pool"""
+        if self.model is None or self.vectorizer is None:
+            self.load_model()
         
-        # Get confidence score
-        confidence = max(probabilities)
+        X = self.vectorizer.transform(queries)
+        n_chunks = min(os.cpu_count() or 1, X.shape[0])
         
-        # Get category information
-        category_info = self.nutrition_responses.get(prediction, {})
+        # The compiled predictor already spreads rows over its own threads
+        if self._predictor is not None or n_chunks < 2:
+            return self._predict_vectors(X)
+        
+        # sklearn releases the GIL while scoring, so row chunks run concurrently
+        bounds = np.linspace(0, X.shape[0], n_chunks + 1, dtype=int)
+        chunks = [X[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+        probabilities = np.vstack(list(_EXEC.map(self._predict_proba, chunks)))
+        return self._predictions_from_proba(probabilities)
+    
+    def _predict_vectors(self, X) -> List[Dict[str, Any]]:
+        """Predict categories for the rows of an already vectorized matrix"""
+        return self._predictions_from_proba(self._predict_proba(X))
+    
+    def _predictions_from_proba(self, probabilities: np.ndarray) -> List[Dict[str, Any]]:
+        """Build responses from a matrix of class probabilities"""
+        # The most probable class is what predict() returns
+        best = np.argmax(probabilities, axis=1)
+        confidences = probabilities[np.arange(len(best)), best]
+        
+        return [
+            self._build_prediction(category, confidence)
+            for category, confidence in zip(self.model.classes_[best], confidences.tolist())
+        ]
+    
+    def _predict_proba(self, X) -> np.ndarray:
+        """Class probabilities from the compiled library when present, else from sklearn"""
+        if self._predictor is not None:
+            import treelite_runtime
+            return self._predictor.predict(treelite_runtime.DMatrix(X))
+        return self.model.predict_proba(X)
+    
+    def _response_template(self, category: str) -> MappingProxyType:
+        """Freeze the description, food lists and meal plan for a category"""
+        category_info = self.nutrition_responses.get(category, {})
+        
+        return MappingProxyType({
+            'description': category_info.get('description', ''),
+            'recommendations': tuple(category_info.get('recommendations', ())),
+            'foods_to_include': tuple(category_info.get('foods_to_include', ())),
+            'foods_to_avoid': tuple(category_info.get('foods_to_avoid', ())),
+            # A plain dict, since the response is passed to json.dumps
+            'meal_plan': self.meal_plans.get(category, {})
+        })
+    
+    def _build_prediction(self, prediction: str, confidence: float) -> Dict[str, Any]:
+        """Assemble the response for a predicted category"""
+        template = self._response_templates.get(prediction) or self._response_template(prediction)
         
         return {
             'category': prediction,
             'confidence': float(confidence),
-            'description': category_info.get('description', ''),
-            'recommendations': category_info.get('recommendations', []),
-            'foods_to_include': category_info.get('foods_to_include', []),
-            'foods_to_avoid': category_info.get('foods_to_avoid', []),
-            'meal_plan': self.meal_plans.get(prediction, {})
+            **template
         }
     
     def generate_nutrition_response(self, query: str, user_context: Dict[str, Any] = None) -> Dict[str, Any]:
@@ -449,7 +579,7 @@ class NutritionClassifier:
         return {
             'query': query,
             'prediction': prediction,
-            'timestamp': pd.Timestamp.now().isoformat(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
             'disclaimer': 'This nutrition advice is for educational purposes only. Consult a registered dietitian for personalized nutrition guidance.'
         }
     
@@ -457,36 +587,76 @@ class NutritionClassifier:
         """Save the trained model and vectorizer"""
         os.makedirs(self.model_path, exist_ok=True)
         
+        # Compress the pickles; joblib.load detects the codec on its own
+        try:
+            import lz4  # noqa: F401
+            compress = ('lz4', 3)
+        except ImportError:
+            compress = ('zlib', 3)
+        
         # Save the model
-        joblib.dump(self.model, os.path.join(self.model_path, 'nutrition_classifier.pkl'))
+        joblib.dump(self.model, os.path.join(self.model_path, 'nutrition_classifier.pkl'), compress=compress)
         
         # Save the vectorizer
-        joblib.dump(self.vectorizer, os.path.join(self.model_path, 'nutrition_vectorizer.pkl'))
+        joblib.dump(self.vectorizer, os.path.join(self.model_path, 'nutrition_vectorizer.pkl'), compress=compress)
         
-        # Save metadata
-        metadata = {
-            'nutrition_categories': self.nutrition_categories,
-            'nutrition_responses': self.nutrition_responses,
-            'meal_plans': self.meal_plans
-        }
-        
-        with open(os.path.join(self.model_path, 'nutrition_metadata.json'), 'w') as f:
-            json.dump(metadata, f, indent=2)
+        # Categories, responses and meal plans are defined in __init__ and
+        # are not persisted alongside the model
         
         logger.info(f"Nutrition model saved to {self.model_path}")
     
+    def compile_model(self) -> Optional[str]:
+        """Compile the tree ensemble to a shared library with Treelite"""
+        lib_path = os.path.join(self.model_path, 'nutrition_classifier.so')
+        
+        # A library left over from an earlier model would disagree with the pickle
+        if os.path.exists(lib_path):
+            os.remove(lib_path)
+        
+        from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+        
+        if not isinstance(self.model, (RandomForestClassifier, GradientBoostingClassifier)):
+            return None
+        
+        try:
+            import treelite
+            
+            tl_model = treelite.sklearn.import_model(self.model)
+            tl_model.export_lib(
+                toolchain='gcc',
+                libpath=lib_path,
+                params={'quantize': 1, 'parallel_comp': 4}
+            )
+        except ImportError as e:
+            logger.warning(f"Treelite compilation unavailable: {e}")
+            return None
+        except Exception as e:
+            # Treelite rejects some estimators, e.g. boosting with a non-zero init
+            logger.warning(f"Treelite compilation failed: {e}")
+            return None
+        
+        logger.info(f"Compiled nutrition model saved to {lib_path}")
+        return lib_path
+    
+    def _load_predictor(self):
+        """Load the compiled library, if one was built for this model"""
+        lib_path = os.path.join(self.model_path, 'nutrition_classifier.so')
+        if not os.path.exists(lib_path):
+            return None
+        
+        try:
+            import treelite_runtime
+            return treelite_runtime.Predictor(lib_path, verbose=False)
+        except ImportError:
+            return None
+    
     def load_model(self):
         """Load the trained model and vectorizer"""
         try:
             self.model = joblib.load(os.path.join(self.model_path, 'nutrition_classifier.pkl'))
             self.vectorizer = joblib.load(os.path.join(self.model_path, 'nutrition_vectorizer.pkl'))
-            
-            # Load metadata
-            with open(os.path.join(self.model_path, 'nutrition_metadata.json'), 'r') as f:
-                metadata = json.load(f)
-                self.nutrition_categories = metadata['nutrition_categories']
-                self.nutrition_responses = metadata['nutrition_responses']
-                self.meal_plans = metadata['meal_plans']
+            self._predictor = self._load_predictor()
+            self._predict_cached.cache_clear()
             
             logger.info("Nutrition model loaded successfully")
         except FileNotFoundError:
@@ -500,6 +670,10 @@ class NutritionClassifier:
 
 # Training script
 if __name__ == "__main__":
+    # The pickled vectorizer refers to _tokenize by module name, so train
+    # through the importable module rather than __main__
+    from nutrition_classifier import NutritionClassifier
+    
     classifier = NutritionClassifier()
     
     # Create and train the model
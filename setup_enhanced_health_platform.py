@@ -289,7 +289,7 @@ A comprehensive health platform with AI-powered nutrition consultation, physioth
 - **Physiotherapy Classifier**: Random Forest, Gradient Boosting, Logistic Regression  
 - **Blood Bank System**: Random Forest with geospatial matching
 - **Symptom Classifier**: Rule-based with Indian healthcare context
-- **Image Classifier**: CNN with EfficientNet backbone
+- **Image Classifier**: CNN with MobileNetV2 backbone
 
 ### Database Schema
 - Users, symptoms, image analysis
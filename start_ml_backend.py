@@ -37,7 +37,7 @@ def check_models():
         "symptom_model.pkl",
         "vectorizer.pkl", 
         "label_encoder.pkl",
-        "skin_classifier.h5",
+        "skin_classifier",
         "skin_classifier_metadata.json"
     ]
     
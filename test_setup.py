@@ -106,7 +106,7 @@ def test_ml_models():
         "symptom_model.pkl",
         "vectorizer.pkl",
         "label_encoder.pkl",
-        "skin_classifier.h5"
+        "skin_classifier"
     ]
     
     missing_models = []
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Test Symptom Checker Response Schema
+Checks the structured-output schema sent to OpenAI is valid for strict mode
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from services.symptom_checker import _ANALYSIS_RESPONSE_FORMAT
+
+
+def _walk(node):
+    """Yield every dict nested anywhere in a JSON schema"""
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _walk(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _walk(item)
+
+
+def test_no_ref_siblings():
+    """Strict mode rejects a $ref that carries other keys"""
+    schema = _ANALYSIS_RESPONSE_FORMAT["json_schema"]["schema"]
+    for node in _walk(schema):
+        if "$ref" in node:
+            assert len(node) == 1, f"$ref with sibling keys: {node}"
+
+
+def test_objects_are_closed():
+    """Every object lists all its properties as required and allows no extras"""
+    schema = _ANALYSIS_RESPONSE_FORMAT["json_schema"]["schema"]
+    for node in _walk(schema):
+        if node.get("type") == "object" and "properties" in node:
+            assert node["additionalProperties"] is False
+            assert sorted(node["required"]) == sorted(node["properties"])
+
+
+def test_severity_inlined():
+    """The condition severity keeps its enum and description after inlining"""
+    schema = _ANALYSIS_RESPONSE_FORMAT["json_schema"]["schema"]
+    severity = schema["$defs"]["PossibleCondition"]["properties"]["severity"]
+    assert "enum" in severity and "description" in severity
+
+
+if __name__ == "__main__":
+    test_no_ref_siblings()
+    test_objects_are_closed()
+    test_severity_inlined()
+    print("✅ Symptom analysis schema is strict-mode compatible")
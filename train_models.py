@@ -56,12 +56,12 @@ def train_image_classifier():
     try:
         classifier = SkinConditionClassifier()
         
-        # Create synthetic training data
-        X, y = classifier.create_synthetic_data(num_samples_per_class=200)
-        logger.info(f"Created {len(X)} training images")
+        # Stream synthetic training data to TFRecord shards instead of holding it in RAM
+        data_path = os.path.join(classifier.model_path, 'synthetic_data')
+        classifier.write_synthetic_tfrecords(data_path, n_per_class=200)
         
         # Train the model
-        results = classifier.train_model(X, y)
+        results = classifier.train_from_tfrecords(data_path)
         
         logger.info("Image classifier training completed!")
         logger.info(f"Test accuracy: {results['test_accuracy']:.4f}")